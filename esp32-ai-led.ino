@@ -7,6 +7,14 @@
 #include <PubSubClient.h>
 #include <ArduinoJson.h>
 
+// ---------- On-device model (optional) ----------
+// `python export_header.py` writes led_model.h next to this sketch.
+// Uncomment LOCAL_MODEL to predict on the ESP32 instead of calling /predict.
+// #define LOCAL_MODEL
+#ifdef LOCAL_MODEL
+#include "led_model.h"
+#endif
+
 // ---------- WiFi ----------
 const char* ssid = "YOUR_WIFI_SSID";
 const char* password = "YOUR_WIFI_PASSWORD";
@@ -34,6 +42,8 @@ float ldrValue = 0;
 int motionValue = 0;
 int ledValue = 0;
 bool aiMode = false;
+String modelETag = "";  // Model version from the last /predict or /status reply
+const char* etagHeader[] = {"ETag"};
 
 // ---------- MQTT Callback ----------
 void onMqttMessage(char* topic, byte* payload, unsigned int length) {
@@ -69,6 +79,10 @@ void setup() {
   tbClient.setCallback(onMqttMessage);
   connectThingsBoard();
 
+#ifdef LOCAL_MODEL
+  aiMode = true;  // Model is compiled in; no /status polling needed
+  Serial.println("Local model " LED_MODEL_VERSION);
+#endif
   Serial.println("System Ready (analogWrite version)");
 }
 
@@ -80,14 +94,19 @@ void loop() {
   ldrValue = analogRead(LDR_PIN);
   motionValue = digitalRead(PIR_PIN);
 
+  // In AI mode every /predict reply doubles as the readiness check
   static unsigned long lastModelCheck = 0;
-  if (millis() - lastModelCheck > 30000) {
+  if (!aiMode && millis() - lastModelCheck > 30000) {
     checkAIModel();
     lastModelCheck = millis();
   }
 
   if (aiMode) {
+#ifdef LOCAL_MODEL
+    ledValue = ledPredict((int)ldrValue, motionValue);
+#else
     getAIPrediction();
+#endif
   }
 
   analogWrite(LED_PIN, ledValue);  // WORKS PERFECTLY NOW
@@ -142,10 +161,17 @@ void checkAIModel() {
   if (WiFi.status() == WL_CONNECTED) {
     HTTPClient http;
     http.begin(flaskStatus);
+    http.collectHeaders(etagHeader, 1);
+    if (modelETag.length() > 0) {
+      http.addHeader("If-None-Match", modelETag);
+    }
     int code = http.GET();
     if (code == 200) {
       String resp = http.getString();
       aiMode = (resp == "ready");
+      modelETag = http.header("ETag");
+    } else if (code == 304) {
+      aiMode = true;  // Same model as last time, empty reply
     }
     http.end();
   }
@@ -157,6 +183,7 @@ void getAIPrediction() {
   if (WiFi.status() == WL_CONNECTED) {
     HTTPClient http;
     http.begin(flaskServer);
+    http.collectHeaders(etagHeader, 1);
     http.addHeader("Content-Type", "application/json");
 
     StaticJsonDocument<128> doc;
@@ -173,6 +200,10 @@ void getAIPrediction() {
       deserializeJson(result, resp);
       ledValue = result["led"];
       Serial.println("Predicted LED: " + String(ledValue));
+      modelETag = http.header("ETag");
+    } else if (code == 404) {
+      aiMode = false;  // Model gone; /status polling takes over again
+      Serial.println("Manual Mode");
     }
     http.end();
   }
@@ -2,35 +2,105 @@
 # app.py  — Flask AI inference server for ESP32 + ThingsBoard
 # ============================================================
 
-from flask import Flask, request, jsonify
-import joblib
-import pandas as pd
+import time
+BOOT = time.perf_counter()  # Start-up breakdown is measured from here
+
+from flask import Flask, Response, g, request, jsonify
 import os
+import metrics
+import model_store
+import request_log
+from device_state import DeviceState
+from model_registry import ModelRegistry
+from shadow import SHADOW_MODEL_PATH, ShadowEvaluator
+import wire_format
+from coalescer import Coalescer
 from flask_cors import CORS  # Install with: pip install flask-cors
 
+model_store.startup["app_imports"] = time.perf_counter() - BOOT
+
 app = Flask(__name__)
 CORS(app)
 
-MODEL_PATH = "led_predictor.pkl"
-model = None
+MAX_BATCH_SIZE = 1000  # Upper bound on readings per /predict/batch call
+
+# Opt-in micro-batching of concurrent /predict calls (useful for forest /
+# compiled serving; LUT lookups are already cheaper than a queue hop)
+COALESCE = os.environ.get("COALESCE", "0") == "1"
+COALESCE_MAX_WAIT_MS = float(os.environ.get("COALESCE_MAX_WAIT_MS", "2"))
+COALESCE_MAX_BATCH = int(os.environ.get("COALESCE_MAX_BATCH", "64"))
+COALESCE_TIMEOUT = 5.0  # Seconds a request waits for its batch result
+
+coalescer = Coalescer(COALESCE_MAX_WAIT_MS, COALESCE_MAX_BATCH) if COALESCE else None
+registry = ModelRegistry()  # Per-device models in MODEL_DIR, global model otherwise
+shadow = ShadowEvaluator() if SHADOW_MODEL_PATH else None  # Candidate model, off the request path
+device_state = DeviceState()  # Rolling per-device features for stateful models
+request_log.setup()
+
+# ============================================================
+# 0️⃣ Request metrics (served at /metrics)
+# ============================================================
+def route_label():
+    return (("route", request.url_rule.rule if request.url_rule else "unmatched"),)
+
+
+def elapsed_ms():
+    return (time.perf_counter() - g.start) * 1000.0
+
+
+def stage(name):
+    return metrics.timed("led_request_stage_seconds", route_label() + (("stage", name),))
+
+
+@app.before_request
+def start_timer():
+    g.start = time.perf_counter()
+    metrics.inflight(1)
+
+
+@app.after_request
+def record_request(response):
+    labels = route_label()
+    metrics.observe("led_request_duration_seconds", labels, time.perf_counter() - g.start)
+    metrics.inc("led_requests_total", labels + (("status", response.status_code),))
+    return response
+
+
+@app.teardown_request
+def end_request(exc):
+    metrics.inflight(-1)
+
 
 # ============================================================
 # 1️⃣ Load model if available
 # ============================================================
-def load_model():
-    global model
-    if os.path.exists(MODEL_PATH):
-        try:
-            model = joblib.load(MODEL_PATH)
-            print("✅ Model loaded successfully:", MODEL_PATH)
-            return True
-        except Exception as e:
-            print("⚠️ Error loading model:", e)
-            model = None
-            return False
-    else:
-        print("❌ Model file not found yet.")
-        return False
+def get_model(device_id=None):
+    """Current ServedModel, loading it on first use. None if unavailable.
+
+    With a device id, that device's own model if MODEL_DIR has one. The
+    global model still gates readiness: it is the fallback for everyone.
+    """
+    served = model_store.current
+    if served is None and model_store.load_model():
+        served = model_store.current
+    if served is not None and device_id:
+        served = registry.get(device_id, served)
+    return served
+
+
+def unavailable_headers():
+    """Retry-After for 404s while a failed load is backing off."""
+    wait = model_store.retry_after()
+    return {"Retry-After": str(int(wait) + 1)} if wait > 0 else {}
+
+
+def version_headers(served):
+    """Model version as X-Model-Version and as an ETag.
+
+    Any 200 carrying an ETag means "model ready", so a device that is
+    already predicting learns readiness and version changes for free.
+    """
+    return {"X-Model-Version": served.version, "ETag": f'"{served.version}"'}
 
 
 # ============================================================
@@ -38,13 +108,20 @@ def load_model():
 # ============================================================
 @app.route("/status", methods=["GET"])
 def status():
-    """ESP32 uses this to check if model is ready."""
-    if os.path.exists(MODEL_PATH):
-        if model is None:
-            load_model()
-        return "ready", 200
-    else:
-        return "not_ready", 404
+    """ESP32 uses this to check if model is ready.
+
+    Answered from memory: the watcher picks up new files, so a loaded
+    model never costs a filesystem stat here. Send the last ETag in
+    If-None-Match to get an empty 304 while the model is unchanged;
+    X-Device-Id reports that device's own model if it has one.
+    """
+    served = get_model(request.headers.get("X-Device-Id"))
+    if served is None:
+        return "not_ready", 404, unavailable_headers()
+    headers = {**version_headers(served), "Cache-Control": "no-cache"}
+    if request.if_none_match.contains_weak(served.version):
+        return "", 304, headers
+    return "ready", 200, headers
 
 
 # ============================================================
@@ -52,46 +129,226 @@ def status():
 # ============================================================
 @app.route("/predict", methods=["POST"])
 def predict():
-    """ESP32 sends LDR + motion readings here for prediction."""
-    global model
+    """ESP32 sends LDR + motion readings here for prediction.
+
+    JSON by default; Content-Type: application/octet-stream selects the
+    compact binary records described in wire_format.py.
+    """
+    if request.mimetype == wire_format.CONTENT_TYPE:
+        served = get_model(request.headers.get("X-Device-Id"))
+        if served is None:
+            return jsonify({"error": "Model not available"}), 404, unavailable_headers()
+        return predict_binary(served)
+
+    try:
+        with stage("parse"):
+            data = request.get_json()
+        device_id = data.get("device_id") or request.headers.get("X-Device-Id")
+        with stage("model"):
+            served = get_model(device_id)  # Pinned for this request, even across a reload
+        if served is None:
+            return jsonify({"error": "Model not available"}), 404, unavailable_headers()
+
+        with stage("features"):
+            ldr = float(data.get("ldr", 0))
+            motion = float(data.get("motion", 0))
+            # Only stateful models read it: stateless traffic skips the lock and the slots
+            state = device_state.update(device_id or request.remote_addr, ldr, motion) if served.stateful else None
 
-    if model is None:
-        if not load_model():
-            return jsonify({"error": "Model not available"}), 404
+        with stage("predict"):
+            if coalescer is not None and served.lut is None and served.cache is None and not served.stateful:
+                pred = coalescer.submit(served, ldr, motion).result(timeout=COALESCE_TIMEOUT)
+            else:
+                pred = served.predict_one(ldr, motion, state)  # Clamped 0–255
+        if shadow is not None and served is model_store.current:
+            shadow.mirror_one(ldr, motion, pred)
 
+        request_log.prediction(device_id or request.remote_addr, ldr, motion, pred, served.version, elapsed_ms())
+
+        # Version goes in a header: the ESP32 parses the body into a 64-byte doc
+        with stage("serialize"):
+            response = jsonify({"led": pred})
+        return response, 200, version_headers(served)
+
+    except Exception as e:
+        request_log.error("Prediction error", e, route="/predict", latency_ms=round(elapsed_ms(), 3))
+        return jsonify({"error": str(e)}), 500
+
+
+def predict_binary(served):
+    """/predict with the fixed-layout binary body (see wire_format.py)."""
+    body = request.get_data(cache=False)
+    if len(body) > MAX_BATCH_SIZE * wire_format.RECORD.size:
+        return f"Batch too large (max {MAX_BATCH_SIZE})", 413
     try:
-        data = request.get_json()
-        ldr = float(data.get("ldr", 0))
-        motion = float(data.get("motion", 0))
+        with stage("predict"):
+            out = wire_format.predict_binary(served, body, device_state,
+                                             request.headers.get("X-Device-Id") or request.remote_addr)
+    except ValueError as e:
+        return str(e), 400
+    except Exception as e:
+        request_log.error("Binary prediction error", e, route="/predict", bytes=len(body))
+        return str(e), 500
 
-        df = pd.DataFrame([[ldr, motion]], columns=["ldr", "motion"])
-        pred = model.predict(df)[0]
-        pred = max(0, min(255, int(pred)))  # Clamp 0–255
+    if shadow is not None and served is model_store.current:
+        shadow.mirror_binary(body, out)
+    request_log.batch(len(out), served.version, elapsed_ms())
+    return Response(out, mimetype=wire_format.CONTENT_TYPE,
+                    headers=version_headers(served))
 
-        print(f"📥 Input: LDR={ldr}, Motion={motion} → Predicted LED={pred}")
 
-        return jsonify({"led": pred}), 200
+# ============================================================
+# 4️⃣ Endpoint: Batch prediction for gateways
+# ============================================================
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """Gateway sends many readings at once; one model.predict call for all.
+
+    Body: {"readings": [{"ldr": 812, "motion": 1, "device_id": "room-1"}, ...]}
+    Reply: {"count": N, "predictions": [{"led": 143, "device_id": "room-1"}, ...]}
+    Predictions are returned in the same order as the readings. Readings
+    from devices with their own model are predicted per model, and those
+    items carry that model's "model_version".
+    """
+    served = get_model()
+    if served is None:
+        return jsonify({"error": "Model not available"}), 404, unavailable_headers()
 
+    with stage("parse"):
+        data = request.get_json(silent=True) or {}
+    readings = data.get("readings")
+    if not isinstance(readings, list) or not readings:
+        return jsonify({"error": "'readings' must be a non-empty list"}), 400
+    if len(readings) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE})"}), 413
+
+    try:
+        with stage("features"):
+            ldr = [float(r.get("ldr", 0)) for r in readings]
+            motion = [float(r.get("motion", 0)) for r in readings]
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid reading: {e}"}), 400
+
+    with stage("model"):
+        groups = {}  # id(ServedModel) → (model, reading indices)
+        for i, r in enumerate(readings):
+            s = registry.get(r.get("device_id"), served)
+            groups.setdefault(id(s), (s, []))[1].append(i)
+
+    try:
+        with stage("predict"):
+            preds = [0] * len(readings)
+            versions = [None] * len(readings)
+            for s, idx in groups.values():
+                sub_ldr, sub_motion = [ldr[i] for i in idx], [motion[i] for i in idx]
+                sub_state = None
+                if s.stateful:  # A device's readings all land in its model's group, in order
+                    sub_state = device_state.update_many([readings[i].get("device_id") for i in idx],
+                                                         sub_ldr, sub_motion)
+                for i, pred in zip(idx, s.predict(sub_ldr, sub_motion, sub_state)):
+                    preds[i] = pred
+                    if s is not served:
+                        versions[i] = s.version
     except Exception as e:
-        print("⚠️ Prediction error:", e)
+        request_log.error("Batch prediction error", e, route="/predict/batch", count=len(readings))
         return jsonify({"error": str(e)}), 500
 
+    if shadow is not None:
+        live = [i for i, version in enumerate(versions) if version is None]
+        shadow.mirror([ldr[i] for i in live], [motion[i] for i in live], [preds[i] for i in live])
+
+    with stage("serialize"):
+        results = []
+        for r, pred, version in zip(readings, preds, versions):
+            item = {"led": pred}
+            if "device_id" in r:
+                item["device_id"] = r["device_id"]
+            if version is not None:
+                item["model_version"] = version
+            results.append(item)
+        response = jsonify({
+            "count": len(results),
+            "predictions": results,
+            "model_version": served.version
+        })
+
+    request_log.batch(len(results), served.version, elapsed_ms())
+    return response, 200, version_headers(served)
+
+
+# ============================================================
+# 5️⃣ Endpoint: Lookup table download for on-device prediction
+# ============================================================
+@app.route("/model/lut", methods=["GET"])
+def model_lut():
+    """Whole response table as one binary blob (format in lut.py).
+
+    Encoded once per model. The ETag is the table's CRC-32, so a device
+    sending If-None-Match gets an empty 304 until the table changes, even
+    across retrains that produce the same table. Accept-Encoding: deflate
+    or gzip selects a compressed body.
+    """
+    served = get_model(request.headers.get("X-Device-Id"))
+    if served is None:
+        return jsonify({"error": "Model not available"}), 404, unavailable_headers()
+    blob = served.lut_blob()
+    if blob is None:
+        return jsonify({"error": "Model uses per-device state and has no table"}), 404
+
+    headers = {
+        "X-Model-Version": served.version,
+        "X-LUT-CRC32": blob.etag,
+        "ETag": f'W/"{blob.etag}"',  # Weak: same table, several encodings
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if request.if_none_match.contains_weak(blob.etag):
+        return "", 304, headers
+
+    body = blob.raw
+    encoding = request.accept_encodings.best_match(["deflate", "gzip"]) if "Accept-Encoding" in request.headers else None
+    if encoding:
+        body = blob.encoded[encoding]
+        headers["Content-Encoding"] = encoding
+    return Response(body, mimetype="application/octet-stream", headers=headers)
+
 
 # ============================================================
-# 4️⃣ Root Endpoint (for quick check)
+# 6️⃣ Root Endpoint (for quick check)
 # ============================================================
 @app.route("/", methods=["GET"])
 def root():
+    served = model_store.current
     return jsonify({
         "service": "ESP32 AI LED Controller",
         "status": "running",
-        "model_loaded": model is not None
+        "model_loaded": served is not None,
+        "model_version": served.version if served else None,
+        "serving_mode": served.mode if served else None,
+        "model_type": served.model_type if served else None,
+        "prediction_cache": served.cache.stats() if served and served.cache else None,
+        "coalescer": coalescer.stats() if coalescer else None,
+        "shadow": shadow.stats() if shadow else None,
+        "device_state": device_state.stats(),
+        "registry": registry.summary(),
+        "startup_ms": {k: round(v * 1000, 1) for k, v in model_store.startup.items()}
     })
 
 
 # ============================================================
-# 5️⃣ Run server
+# 7️⃣ Metrics Endpoint (Prometheus text format)
+# ============================================================
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ============================================================
+# 8️⃣ Run server
 # ============================================================
 if __name__ == "__main__":
     print("🚀 Starting Flask AI Server...")
+    # Listen right away; /status says not_ready until the model is loaded and warm
+    model_store.start_background_load(BOOT)
+    model_store.start_watcher()
     app.run(host="0.0.0.0", port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,248 @@
+# ============================================================
+# asgi_app.py  — Async (ASGI) serving mode for large fleets
+# ============================================================
+#
+# Same /status, /predict and / routes as app.py, as a plain ASGI
+# callable on one event loop. Idle keep-alive connections cost a socket
+# and a few KB, not a thread. LUT lookups run inline (they are cheaper
+# than a thread hop); forest / compiled evaluation goes to a bounded
+# thread pool, and when EXECUTOR_MAX_PENDING jobs are already queued
+# new requests get 503 + Retry-After instead of piling up.
+#
+# Usage:
+#   pip install uvicorn
+#   python asgi_app.py                        # port 5000, keep-alive 30 s
+#   uvicorn asgi_app:app --port 5000 --timeout-keep-alive 30
+# Compare against the threaded Flask server with compare_servers.py.
+
+import time
+BOOT = time.perf_counter()
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import lut
+import metrics
+import model_store
+import request_log
+import wire_format
+from device_state import DeviceState
+
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "5000"))
+KEEP_ALIVE_TIMEOUT = int(os.environ.get("KEEP_ALIVE_TIMEOUT", "30"))  # > the 5 s device loop
+EXECUTOR_WORKERS = int(os.environ.get("EXECUTOR_WORKERS", str(os.cpu_count() or 1)))
+EXECUTOR_MAX_PENDING = int(os.environ.get("EXECUTOR_MAX_PENDING", "256"))
+MAX_BODY_BYTES = 64 * 1024
+
+model_store.startup["app_imports"] = time.perf_counter() - BOOT
+request_log.setup()
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="predict")
+pending = 0  # Jobs submitted to the executor and not finished; event-loop only
+device_state = DeviceState()  # Rolling per-device features for stateful models
+
+
+class Overloaded(Exception):
+    pass
+
+
+async def run_in_executor(fn, *args):
+    """Bounded offload: refuse instead of queueing without limit."""
+    global pending
+    if pending >= EXECUTOR_MAX_PENDING:
+        raise Overloaded()
+    pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    finally:
+        pending -= 1
+
+
+async def get_model():
+    served = model_store.current
+    if served is None and await run_in_executor(model_store.load_model):
+        served = model_store.current
+    return served
+
+
+def unavailable_headers():
+    wait = model_store.retry_after()
+    return [(b"retry-after", str(int(wait) + 1).encode())] if wait > 0 else []
+
+
+# ============================================================
+# Plumbing
+# ============================================================
+async def read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def respond(send, status, body, content_type=b"application/json", headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type),
+                    (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+    return status
+
+
+def json_body(obj):
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def version_header(served):
+    version = served.version.encode()
+    return [(b"x-model-version", version), (b"etag", b'"' + version + b'"')]
+
+
+def etag_matches(scope, served):
+    """If-None-Match lists this model's ETag (or is `*`)."""
+    header = dict(scope["headers"]).get(b"if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix(b"W/").strip(b'"') for t in header.split(b",")]
+    return b"*" in tags or served.version.encode() in tags
+
+
+# ============================================================
+# Routes
+# ============================================================
+async def status(scope, body, send):
+    served = await get_model()
+    if served is None:
+        return await respond(send, 404, b"not_ready", b"text/html; charset=utf-8", unavailable_headers())
+    headers = version_header(served) + [(b"cache-control", b"no-cache")]
+    if etag_matches(scope, served):
+        return await respond(send, 304, b"", b"text/html; charset=utf-8", headers)
+    return await respond(send, 200, b"ready", b"text/html; charset=utf-8", headers)
+
+
+async def predict(scope, body, send, start):
+    served = await get_model()
+    if served is None:
+        return await respond(send, 404, json_body({"error": "Model not available"}), headers=unavailable_headers())
+
+    headers = dict(scope["headers"])
+    content_type = headers.get(b"content-type", b"").split(b";")[0].decode()
+    client_id = headers.get(b"x-device-id", b"").decode() or (scope.get("client") or ("?",))[0]
+    try:
+        if content_type == wire_format.CONTENT_TYPE:
+            try:
+                # Only a pure table gather runs on the loop; any off-grid record means a forest call
+                out = wire_format.lookup_binary(served.lut, body) if served.lut is not None else None
+                if out is None:
+                    out = await run_in_executor(wire_format.predict_binary, served, body, device_state, client_id)
+            except ValueError as e:  # Misaligned body: the client's fault, as in app.py
+                return await respond(send, 400, str(e).encode(), b"text/html; charset=utf-8")
+            return await respond(send, 200, out, wire_format.CONTENT_TYPE.encode(), version_header(served))
+
+        data = json.loads(body)
+        device_id = data.get("device_id") or client_id
+        ldr = float(data.get("ldr", 0))
+        motion = float(data.get("motion", 0))
+        state = device_state.update(device_id, ldr, motion) if served.stateful else None
+        pred = lut.lookup(served.lut, ldr, motion) if served.lut is not None else None
+        if pred is None:
+            pred = await run_in_executor(served.predict_one, ldr, motion, state)
+    except Overloaded:
+        raise
+    except Exception as e:
+        request_log.error("Prediction error", e, route="/predict")
+        return await respond(send, 500, json_body({"error": str(e)}))
+
+    request_log.prediction(device_id, ldr, motion, pred, served.version,
+                           (time.perf_counter() - start) * 1000.0)
+    return await respond(send, 200, json_body({"led": pred}), headers=version_header(served))
+
+
+async def root(scope, body, send):
+    served = model_store.current
+    return await respond(send, 200, json_body({
+        "service": "ESP32 AI LED Controller",
+        "status": "running",
+        "server": "asgi",
+        "model_loaded": served is not None,
+        "model_version": served.version if served else None,
+        "serving_mode": served.mode if served else None,
+        "executor_pending": pending,
+        "device_state": device_state.stats(),
+        "startup_ms": {k: round(v * 1000, 1) for k, v in model_store.startup.items()},
+    }))
+
+
+async def metrics_endpoint(scope, body, send):
+    return await respond(send, 200, metrics.render().encode(), b"text/plain; version=0.0.4")
+
+
+ROUTES = {
+    ("GET", "/status"): status,
+    ("POST", "/predict"): predict,
+    ("GET", "/"): root,
+    ("GET", "/metrics"): metrics_endpoint,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            model_store.start_background_load(BOOT)
+            model_store.start_watcher()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            executor.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    start = time.perf_counter()
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    route = scope["path"] if handler else "unmatched"
+    metrics.inflight(1)
+    try:
+        body = await read_body(receive)
+        if body is None:
+            code = await respond(send, 413, json_body({"error": "Body too large"}))
+        elif handler is None:
+            code = await respond(send, 404, json_body({"error": "Not found"}))
+        elif handler is predict:
+            code = await predict(scope, body, send, start)
+        else:
+            code = await handler(scope, body, send)
+    except Overloaded:
+        code = await respond(send, 503, json_body({"error": "Overloaded"}), headers=[(b"retry-after", b"1")])
+    finally:
+        metrics.inflight(-1)
+
+    labels = (("route", route),)
+    metrics.observe("led_request_duration_seconds", labels, time.perf_counter() - start)
+    metrics.inc("led_requests_total", labels + (("status", code),))
+
+
+if __name__ == "__main__":
+    import uvicorn  # Install with: pip install uvicorn
+
+    print("🚀 Starting ASGI AI Server...")
+    uvicorn.run(app, host=HOST, port=PORT, timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+                access_log=False, lifespan="on")
@@ -0,0 +1,185 @@
+# ============================================================
+# bench.py  — Micro-benchmarks of the inference core
+# ============================================================
+#
+# Measures prediction paths in isolation (no Flask, no network):
+#   dataframe   pd.DataFrame + model.predict   (the original /predict path)
+#   numpy       np.ndarray + model.predict
+#   forest      ServedModel in SERVING_MODE=forest
+#   compiled    ServedModel backed by CompiledForest
+#   lut         ServedModel backed by the 8192-cell table
+# each at several batch sizes, reporting time per call, time per
+# prediction and peak bytes allocated per call (tracemalloc).
+#
+# Usage:
+#   python bench.py --json bench.json                 # run and save
+#   python bench.py --baseline bench.json             # fail on regressions
+#   python bench.py --quick --cases "lut|compiled"    # subset, fewer repeats
+
+import argparse
+import json
+import platform
+import re
+import sys
+import time
+import tracemalloc
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+import lut
+from compiled_forest import CompiledForest
+from model_store import ServedModel, file_version
+
+BATCH_SIZES = (1, 16, 256, 4096)
+
+
+def make_inputs(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    ldr = rng.integers(0, lut.LDR_LEVELS, rows).astype(float)
+    motion = rng.integers(0, lut.MOTION_LEVELS, rows).astype(float)
+    return ldr, motion
+
+
+def build_cases(model, version):
+    forest = ServedModel(model, version)
+    compiled = ServedModel(model, version, compiled=CompiledForest(model))
+    table = ServedModel(model, version, table=lut.build_lut(model))
+    served = {"forest": forest, "compiled": compiled, "lut": table}
+
+    cases = {}
+    for rows in BATCH_SIZES:
+        ldr, motion = make_inputs(rows)
+        X = np.column_stack([ldr, motion])
+        cases[f"dataframe/{rows}"] = (rows, lambda l=ldr, m=motion: model.predict(
+            pd.DataFrame({"ldr": l, "motion": m})))
+        cases[f"numpy/{rows}"] = (rows, lambda X=X: model.predict(X))
+        for name, s in served.items():
+            if rows == 1:
+                l0, m0 = float(ldr[0]), float(motion[0])
+                cases[f"{name}/1"] = (1, lambda s=s, l=l0, m=m0: s.predict_one(l, m))
+            else:
+                cases[f"{name}/{rows}"] = (rows, lambda s=s, l=ldr, m=motion: s.predict(l, m))
+    return cases
+
+
+def time_per_call(fn, min_time):
+    """Best-of-5 mean seconds per call; repeat count grows until a run takes min_time."""
+    fn()  # Warm-up
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def peak_alloc_per_call(fn):
+    """Peak traced bytes allocated during one call."""
+    tracemalloc.start()
+    try:
+        fn()  # First call may populate caches; measure the second
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def run(model_path, pattern, min_time):
+    model = joblib.load(model_path)
+    cases = build_cases(model, file_version(model_path))
+    results = {}
+    for name, (rows, fn) in cases.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        with warnings.catch_warnings():  # numpy/* cases pass bare arrays on purpose
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            per_call = time_per_call(fn, min_time)
+            peak = peak_alloc_per_call(fn)
+        results[name] = {
+            "rows": rows,
+            "us_per_call": round(per_call * 1e6, 3),
+            "us_per_prediction": round(per_call * 1e6 / rows, 4),
+            "peak_alloc_bytes_per_call": peak,
+        }
+        r = results[name]
+        print(f"{name:16s} {r['us_per_call']:12.1f}µs/call {r['us_per_prediction']:10.3f}µs/pred "
+              f"{r['peak_alloc_bytes_per_call'] / 1024:10.1f} KB peak")
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "machine": platform.machine(),
+            "model_version": file_version(model_path),
+            "n_trees": len(getattr(model, "estimators_", [])),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Print per-case ratios vs baseline; return the names that regressed."""
+    regressions = []
+    print(f"\n{'case':16s} {'baseline':>12s} {'current':>12s} {'ratio':>7s}")
+    for name, r in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            continue
+        ratio = r["us_per_prediction"] / old["us_per_prediction"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  ✗ regression"
+        print(f"{name:16s} {old['us_per_prediction']:10.3f}µs {r['us_per_prediction']:10.3f}µs "
+              f"{ratio:6.2f}×{flag}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark LED model prediction paths.")
+    parser.add_argument("--model", default="led_predictor.pkl")
+    parser.add_argument("--cases", help="regex selecting case names, e.g. 'lut|compiled/1$'")
+    parser.add_argument("--quick", action="store_true", help="shorter timing runs")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown per case before failing (0.25 = 25%%)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    current = run(args.model, args.cases, min_time=0.02 if args.quick else 0.2)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\n✓ Results written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"\n✗ {len(regressions)} case(s) slower than baseline by more than "
+                  f"{args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✓ No regressions against baseline")
@@ -0,0 +1,106 @@
+# ============================================================
+# coalescer.py  — Micro-batching of concurrent /predict calls
+# ============================================================
+#
+# Request threads drop (model, ldr, motion) into a queue and wait on a
+# Future. One worker thread drains the queue for up to `max_wait_ms`
+# or `max_batch` items, runs a single vectorized predict per model
+# version, and hands each result back to its waiting request.
+
+import math
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class Coalescer:
+    def __init__(self, max_wait_ms=2.0, max_batch=64):
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max_batch
+        self.start()
+        # Threads do not survive fork: pre-forked workers get their own
+        os.register_at_fork(after_in_child=self.start)
+
+    def start(self):
+        self.queue = queue.SimpleQueue()
+        self.batch_sizes = Counter()  # batch size → number of batches
+        self.stats_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True, name="predict-coalescer")
+        self.thread.start()
+
+    def submit(self, served, ldr, motion):
+        """Queue one reading; the Future resolves to the clamped prediction."""
+        future = Future()
+        if not (math.isfinite(ldr) and math.isfinite(motion)):
+            # Fail here, not in the worker: one inf would fail its whole batch
+            future.set_exception(ValueError(f"non-finite reading: ldr={ldr}, motion={motion}"))
+            return future
+        self.queue.put((served, ldr, motion, future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    def flush(self, batch):
+        with self.stats_lock:
+            self.batch_sizes[len(batch)] += 1
+
+        # Requests pinned different models if a reload landed mid-batch
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[0], []).append(item)
+
+        for served, items in groups.items():
+            try:
+                preds = served.predict([i[1] for i in items], [i[2] for i in items])
+            except Exception:
+                self.flush_each(served, items)
+                continue
+            for item, pred in zip(items, preds):
+                item[3].set_result(pred)
+
+    def flush_each(self, served, items):
+        """Group predict failed: retry one by one so only the bad readings fail."""
+        for item in items:
+            try:
+                item[3].set_result(served.predict([item[1]], [item[2]])[0])
+            except Exception as e:
+                item[3].set_exception(e)
+
+    def stats(self):
+        """Batch-size metrics: totals plus a power-of-two histogram."""
+        with self.stats_lock:
+            sizes = dict(self.batch_sizes)
+
+        batches = sum(sizes.values())
+        items = sum(size * count for size, count in sizes.items())
+        histogram = Counter()
+        for size, count in sizes.items():
+            bucket = 1
+            while bucket < size:
+                bucket *= 2
+            histogram[f"le_{bucket}"] += count
+
+        return {
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_batch": self.max_batch,
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "largest_batch": max(sizes, default=0),
+            "batch_size_histogram": dict(sorted(histogram.items(), key=lambda kv: int(kv[0][3:]))),
+        }
@@ -0,0 +1,69 @@
+# ============================================================
+# compare_servers.py  — Threaded Flask vs ASGI under fleet load
+# ============================================================
+#
+# Starts each server in turn on the same port (app.py, then
+# asgi_app.py), waits for /status to report ready, drives it with the
+# loadgen.py fleet profile and prints the two summaries side by side.
+# Extra arguments are passed to the fleet, e.g.:
+#
+#   python compare_servers.py --devices 3000 --duration 60 --keep-alive
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import loadgen
+
+SERVERS = {
+    "flask-threaded": [sys.executable, "app.py"],
+    "asgi": [sys.executable, "asgi_app.py"],
+}
+PORT = 5000  # app.py always listens here
+
+
+def wait_ready(url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/status", timeout=1) as r:
+                if r.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def run_one(name, command, args):
+    env = dict(os.environ, PORT=str(PORT), LOG_MODE="json", LOG_SAMPLE_EVERY="1000000")
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(args.url):
+            print(f"✗ {name} did not become ready")
+            return None
+        print(f"\n===== {name} =====")
+        fleet = loadgen.Fleet(args)
+        elapsed = asyncio.run(fleet.run())
+        return loadgen.report(fleet, elapsed)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    sys.argv += [] if any(a.startswith("--url") for a in sys.argv) else [f"--url=http://127.0.0.1:{PORT}"]
+    args = loadgen.parse_args()
+    results = {name: run_one(name, cmd, args) for name, cmd in SERVERS.items()}
+
+    print(f"\n{'server':16s} {'endpoint':10s} {'rps':>8s} {'err%':>7s} {'p50 ms':>8s} {'p99 ms':>8s}")
+    for name, summary in results.items():
+        if summary is None:
+            continue
+        for path, e in summary["endpoints"].items():
+            p50 = f"{e['p50_ms']:8.2f}" if e["p50_ms"] is not None else f"{'-':>8s}"
+            p99 = f"{e['p99_ms']:8.2f}" if e["p99_ms"] is not None else f"{'-':>8s}"
+            print(f"{name:16s} {path:10s} {e['rps']:8.1f} {e['error_rate'] * 100:6.2f}% {p50} {p99}")
@@ -0,0 +1,120 @@
+# ============================================================
+# compiled_forest.py  — Array-compiled RandomForest evaluator
+# ============================================================
+#
+# Flattens every tree of a fitted RandomForestRegressor into one set
+# of contiguous NumPy arrays (feature, threshold, left, right, value)
+# and walks all trees for a whole batch in lock-step, one depth level
+# per NumPy operation. No sklearn validation, no per-tree Python loop.
+#
+# Usage (benchmark against model.predict):
+#   python compiled_forest.py [led_predictor.pkl]
+
+import sys
+import time
+
+import numpy as np
+
+CHUNK_ROWS = 4096  # Bounds the (n_trees × rows) node-index matrix
+
+
+class CompiledForest:
+    """Drop-in .predict() for a fitted RandomForestRegressor (or one tree)."""
+
+    def __init__(self, forest):
+        trees = [est.tree_ for est in getattr(forest, "estimators_", [forest])]
+        counts = np.array([t.node_count for t in trees])
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+        feature, threshold, left, right, value = [], [], [], [], []
+        for t, off in zip(trees, offsets):
+            idx = np.arange(t.node_count)
+            leaf = t.children_left == -1
+            # Leaves point at themselves with an always-true split, so every
+            # row can take exactly `depth` steps regardless of where it stops.
+            feature.append(np.where(leaf, 0, t.feature))
+            threshold.append(np.where(leaf, np.inf, t.threshold))
+            left.append(np.where(leaf, idx, t.children_left) + off)
+            right.append(np.where(leaf, idx, t.children_right) + off)
+            value.append(t.value[:, 0, 0])
+
+        self.feature = np.ascontiguousarray(np.concatenate(feature), dtype=np.intp)
+        self.threshold = np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64)
+        self.left = np.ascontiguousarray(np.concatenate(left), dtype=np.intp)
+        self.right = np.ascontiguousarray(np.concatenate(right), dtype=np.intp)
+        self.value = np.ascontiguousarray(np.concatenate(value), dtype=np.float64)
+        self.roots = offsets.astype(np.intp)
+        self.depth = max(t.max_depth for t in trees)
+        self.n_trees = len(trees)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left,
+                                      self.right, self.value, self.roots))
+
+    def predict(self, X):
+        # sklearn compares float32 inputs against float64 thresholds; do the same
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), CHUNK_ROWS):
+            out[start:start + CHUNK_ROWS] = self._predict_chunk(X[start:start + CHUNK_ROWS])
+        return out
+
+    def _predict_chunk(self, X):
+        rows = np.arange(len(X))
+        node = np.repeat(self.roots[:, None], len(X), axis=1)
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node].sum(axis=0) / self.n_trees
+
+
+# ============================================================
+# Benchmark: compiled vs model.predict
+# ============================================================
+def time_call(fn, repeats):
+    """Best-of-3 mean seconds per call over `repeats` calls."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeats)
+    return best
+
+
+def benchmark(model, compiled, rows=10_000, seed=0):
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.integers(0, 4096, rows).astype(float),
+        rng.integers(0, 2, rows).astype(float),
+    ])
+    df = pd.DataFrame(X, columns=["ldr", "motion"])
+
+    max_diff = float(np.max(np.abs(model.predict(df) - compiled.predict(X))))
+    print(f"Max |sklearn - compiled| over {rows} rows: {max_diff:.3g}")
+
+    one_df, one_x = df.iloc[:1], X[:1]
+    results = {
+        "single_sklearn": time_call(lambda: model.predict(one_df), 50),
+        "single_compiled": time_call(lambda: compiled.predict(one_x), 50),
+        "batch_sklearn": time_call(lambda: model.predict(df), 3),
+        "batch_compiled": time_call(lambda: compiled.predict(X), 3),
+    }
+
+    print(f"\n{'case':18s} {'sklearn':>12s} {'compiled':>12s} {'speed-up':>9s}")
+    for case, label in (("single", "1 row"), ("batch", f"{rows} rows")):
+        sk, cf = results[f"{case}_sklearn"], results[f"{case}_compiled"]
+        print(f"{label:18s} {sk * 1e3:10.3f}ms {cf * 1e3:10.3f}ms {sk / cf:8.1f}×")
+    return results
+
+
+if __name__ == "__main__":
+    import joblib
+    path = sys.argv[1] if len(sys.argv) > 1 else "led_predictor.pkl"
+    model = joblib.load(path)
+    compiled = CompiledForest(model)
+    print(f"Compiled {compiled.n_trees} trees, depth {compiled.depth}, "
+          f"{len(compiled.value)} nodes, {compiled.nbytes / 1024:.0f} KB")
+    benchmark(model, compiled)
@@ -0,0 +1,151 @@
+# ============================================================
+# device_state.py  — Per-device rolling features in fixed arrays
+# ============================================================
+#
+# One reading says little about a room: a PIR trigger drops out for a
+# sample and the LDR jitters. DeviceState keeps a short history per
+# device and turns each reading into three extra model features:
+#
+#   ldr_ema        exponential moving average of LDR (EMA_ALPHA per reading)
+#   since_motion   seconds since the last reading with motion (capped)
+#   motion_count   readings with motion among the last MOTION_WINDOW
+#
+# All state lives in preallocated NumPy arrays indexed by a slot per
+# device (≈ 36 bytes per device at the default window), so an update is
+# a handful of array writes and a 100k-device table is a few MB with no
+# per-reading objects. When the table is full the least recently seen
+# device's slot is reused.
+#
+# train_model.py --stateful replays history through the same class, so
+# the features a model is trained on are the ones it is served with.
+
+import os
+import threading
+import time
+
+import numpy as np
+
+FEATURES = ("ldr_ema", "since_motion", "motion_count")
+STATE_CAPACITY = int(os.environ.get("STATE_CAPACITY", "100000"))  # Devices tracked
+MOTION_WINDOW = int(os.environ.get("MOTION_WINDOW", "12"))  # Readings (1 min at the 5 s loop)
+EMA_ALPHA = float(os.environ.get("EMA_ALPHA", "0.3"))
+SINCE_MOTION_MAX = 3600.0  # Seconds; also the value before any motion was seen
+
+
+def cold_features(ldr, motion):
+    """Features for readings with no history (first reading of a device)."""
+    ldr = np.asarray(ldr, dtype=float)
+    motion = np.asarray(motion, dtype=float)
+    return (ldr, np.where(motion > 0, 0.0, SINCE_MOTION_MAX), (motion > 0).astype(float))
+
+
+class DeviceState:
+    def __init__(self, capacity=STATE_CAPACITY, window=MOTION_WINDOW, alpha=EMA_ALPHA):
+        self.capacity = capacity
+        self.window = window
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.slots = {}  # device_id → row in the arrays below
+        self.owners = [None] * capacity  # row → device_id, for reuse
+        self.ema = np.zeros(capacity, dtype=np.float32)
+        self.last_seen = np.full(capacity, -np.inf)
+        self.last_motion = np.full(capacity, -np.inf)
+        self.ring = np.zeros((capacity, window), dtype=np.uint8)  # Motion flags, circular
+        self.pos = np.zeros(capacity, dtype=np.uint16)
+        self.count = np.zeros(capacity, dtype=np.uint16)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.ema, self.last_seen, self.last_motion,
+                                      self.ring, self.pos, self.count))
+
+    def slot(self, device_id):
+        """Row for this device, claiming a free or least recently seen one (lock held)."""
+        row = self.slots.get(device_id)
+        if row is not None:
+            return row, False
+        if len(self.slots) < self.capacity:
+            row = len(self.slots)
+        else:
+            row = int(np.argmin(self.last_seen))  # O(capacity), only once the table is full
+            del self.slots[self.owners[row]]
+            self.ring[row] = 0
+            self.pos[row] = self.count[row] = 0
+            self.last_motion[row] = -np.inf
+        self.slots[device_id] = row
+        self.owners[row] = device_id
+        return row, True
+
+    def update_locked(self, device_id, ldr, motion, now):
+        row, new = self.slot(device_id)
+        moving = 1 if motion > 0 else 0
+
+        ema = ldr if new else self.ema[row] + self.alpha * (ldr - self.ema[row])
+        self.ema[row] = ema
+        self.last_seen[row] = now
+        if moving:
+            self.last_motion[row] = now
+        since = min(now - self.last_motion[row], SINCE_MOTION_MAX)
+
+        p = self.pos[row]
+        count = int(self.count[row]) - int(self.ring[row, p]) + moving
+        self.ring[row, p] = moving
+        self.pos[row] = (p + 1) % self.window
+        self.count[row] = count
+        return float(ema), float(since), float(count)
+
+    def update(self, device_id, ldr, motion, now=None):
+        """Record one reading; returns its (ldr_ema, since_motion, motion_count)."""
+        now = time.time() if now is None else now
+        with self.lock:
+            return self.update_locked(device_id, ldr, motion, now)
+
+    def update_many(self, device_ids, ldr, motion, now=None):
+        """Record readings in order; returns one feature array per FEATURES.
+
+        Readings without a device id get cold_features() and leave no state.
+        """
+        now = time.time() if now is None else now
+        ema, since, count = (np.array(f) for f in cold_features(ldr, motion))
+        with self.lock:
+            for i, device_id in enumerate(device_ids):
+                if device_id:
+                    ema[i], since[i], count[i] = self.update_locked(device_id, ldr[i], motion[i], now)
+        return ema, since, count
+
+    def stats(self):
+        return {
+            "devices": len(self.slots),
+            "capacity": self.capacity,
+            "motion_window": self.window,
+            "ema_alpha": self.alpha,
+            "state_bytes": self.nbytes,
+        }
+
+
+def add_features(df, window=MOTION_WINDOW, alpha=EMA_ALPHA):
+    """Training-side replay: FEATURES columns for a telemetry frame.
+
+    Rows are replayed per device in timestamp order (`ts`, datetime or
+    epoch seconds; `device_id` optional, one device if absent).
+    """
+    import pandas as pd  # Deferred: the serving path does not need pandas
+
+    ts = df["ts"]
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        seconds = (ts - pd.Timestamp(0)).dt.total_seconds().to_numpy()
+    else:
+        seconds = ts.to_numpy(dtype=float)
+    devices = df["device_id"].astype(str).to_numpy() if "device_id" in df.columns else np.full(len(df), "device")
+    ldr = df["ldr"].to_numpy(dtype=float)
+    motion = df["motion"].to_numpy(dtype=float)
+
+    state = DeviceState(capacity=max(len(set(devices)), 1), window=window, alpha=alpha)
+    out = np.empty((len(df), len(FEATURES)))
+    for i in np.argsort(seconds, kind="stable"):
+        out[i] = state.update_locked(devices[i], ldr[i], motion[i], seconds[i])
+
+    df = df.copy()
+    for j, name in enumerate(FEATURES):
+        df[name] = out[:, j]
+    return df
@@ -0,0 +1,145 @@
+# ============================================================
+# distill.py  — Compress the forest into a small student model
+# ============================================================
+#
+# The forest only ever sees 8192 distinct inputs, so a student can be
+# fitted to its exact answers over the whole grid:
+#
+#   tree   one DecisionTreeRegressor with at most --leaves leaves
+#   pwl    PiecewiseLinear: knots per motion row within --budget bytes,
+#          evaluated with the same integer maths as export_header.py
+#
+# Both have the sklearn predict() / feature_names_in_ interface, so
+# model_store serves a saved student like any other model (LUT, compiled
+# for trees, plain predict for PWL) and reports its model_type in /.
+#
+# Usage:
+#   python distill.py                                    # compare sizes, save nothing
+#   python distill.py --student pwl --budget 1024 --out led_predictor.pkl
+
+import argparse
+import os
+import pickle
+
+import numpy as np
+
+import lut
+from compiled_forest import time_call
+from export_header import KNOT_BYTES, fit_pwl, interpolate
+
+LEAVES = (16, 32, 64, 128, 256)
+BUDGETS = (256, 512, 1024, 2048)
+BATCH_ROWS = 4096
+
+
+class PiecewiseLinear:
+    """Student model: per-motion-row (ldr, value) knots, linear in between."""
+
+    model_type = "pwl"
+
+    def __init__(self, knots, values):
+        self.knots = [np.asarray(k, dtype=np.int64) for k in knots]
+        self.values = [np.asarray(v, dtype=np.int64) for v in values]
+        self.feature_names_in_ = np.array(["ldr", "motion"], dtype=object)
+        self.n_features_in_ = 2
+
+    @classmethod
+    def from_table(cls, table, budget):
+        rows = fit_pwl(table, budget)
+        return cls(rows, [table[m][r] for m, r in enumerate(rows)])
+
+    @property
+    def nbytes(self):
+        return sum(len(k) for k in self.knots) * KNOT_BYTES
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=float)
+        ldr = np.clip(X[:, 0], 0, lut.LDR_LEVELS - 1)
+        moving = X[:, 1] > 0
+        out = np.empty(len(X))
+        for m, mask in enumerate((~moving, moving)):
+            if mask.any():
+                out[mask] = interpolate(self.knots[m], self.values[m], ldr[mask])
+        return out
+
+
+def distill_tree(table, leaves):
+    """Fit a single tree to the forest's clamped answers over the grid."""
+    from sklearn.tree import DecisionTreeRegressor
+
+    return DecisionTreeRegressor(max_leaf_nodes=leaves, random_state=0).fit(
+        lut.grid_frame(), table.reshape(-1).astype(float))
+
+
+# ============================================================
+# Fidelity / speed report
+# ============================================================
+def measure(model, table):
+    """Grid error against the forest table, predict timings and pickled size."""
+    import pandas as pd
+
+    error = np.abs(lut.build_lut(model).astype(int) - table.astype(int))
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({"ldr": rng.integers(0, lut.LDR_LEVELS, BATCH_ROWS).astype(float),
+                      "motion": rng.integers(0, lut.MOTION_LEVELS, BATCH_ROWS).astype(float)})
+    row = X.iloc[:1]
+    return {
+        "max_err": int(error.max()),
+        "mean_err": float(error.mean()),
+        "exact": float(np.mean(error == 0)),
+        "row_us": time_call(lambda: model.predict(row), 20) * 1e6,
+        "batch_ms": time_call(lambda: model.predict(X), 3) * 1e3,
+        "bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+    }
+
+
+def report(forest, table):
+    forest.n_jobs = 1  # Time tree work, not thread dispatch
+    rows = [("forest", f"{len(forest.estimators_)} trees", forest)]
+    rows += [("tree", f"{n} leaves", distill_tree(table, n)) for n in LEAVES]
+    rows += [("pwl", f"{b} B budget", PiecewiseLinear.from_table(table, b)) for b in BUDGETS]
+
+    base = None
+    print(f"{'student':8s} {'size':>14s} {'max |Δ|':>8s} {'mean |Δ|':>9s} {'exact':>7s} "
+          f"{'pickle KB':>10s} {'1-row µs':>9s} {f'{BATCH_ROWS}-row ms':>12s} {'speed-up':>9s}")
+    for kind, label, model in rows:
+        r = measure(model, table)
+        base = base or r
+        print(f"{kind:8s} {label:>14s} {r['max_err']:8d} {r['mean_err']:9.3f} {r['exact']:7.1%} "
+              f"{r['bytes'] / 1024:10.1f} {r['row_us']:9.0f} {r['batch_ms']:12.2f} "
+              f"{base['batch_ms'] / r['batch_ms']:8.0f}×")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Distill the LED forest into a small student model.")
+    parser.add_argument("model", nargs="?", default="led_predictor.pkl")
+    parser.add_argument("--student", choices=("tree", "pwl"), help="fit and save this student")
+    parser.add_argument("--leaves", type=int, default=64, help="tree student: max leaf nodes")
+    parser.add_argument("--budget", type=int, default=1024, help="pwl student: bytes of knots")
+    parser.add_argument("--out", default="led_student.pkl",
+                        help="where to save; led_predictor.pkl to serve it (hot-reloaded)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import joblib
+
+    args = parse_args()
+    forest = joblib.load(args.model)
+    table = lut.build_lut(forest)
+
+    if args.student is None:
+        report(forest, table)
+    else:
+        if args.student == "tree":
+            student = distill_tree(table, args.leaves)
+        else:
+            import distill  # Pickle the class as distill.PiecewiseLinear, not __main__'s
+            student = distill.PiecewiseLinear.from_table(table, args.budget)
+        r = measure(student, table)
+        # Write then rename: the watcher never sees a half-written file
+        joblib.dump(student, args.out + ".tmp")
+        os.replace(args.out + ".tmp", args.out)
+        print(f"✓ {args.student} student saved to {args.out} ({r['bytes'] / 1024:.1f} KB)")
+        print(f"  Error vs forest over all {table.size} inputs: max {r['max_err']}, "
+              f"mean {r['mean_err']:.3f}, exact {r['exact']:.1%}")
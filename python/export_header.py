@@ -0,0 +1,165 @@
+# ============================================================
+# export_header.py  — Model → C header for on-device inference
+# ============================================================
+#
+# The model only has 8192 possible inputs, so the ESP32 can carry its
+# whole response surface and skip the /predict round trip. Two formats:
+#
+#   table  the full uint8 LUT[2][4096] (8 KB of flash), exact
+#   pwl    piecewise-linear knots per motion row, chosen greedily where
+#          the error is largest until --budget bytes are used
+#
+# Both define LED_MODEL_VERSION and `uint8_t ledPredict(int ldr, int motion)`.
+# Errors are measured with the same integer arithmetic the device runs,
+# against the forest's clamped 0–255 predictions (the LUT).
+#
+# Usage:
+#   python export_header.py                               # table → ../led_model.h
+#   python export_header.py --format pwl --budget 1024    # ≤ 1 KB of knots
+
+import argparse
+import sys
+
+import numpy as np
+
+import lut
+from model_store import file_version, model_features
+
+KNOT_BYTES = 3  # uint16 ldr + uint8 value
+GRID = np.arange(lut.LDR_LEVELS)
+
+
+def interpolate(knots, values, x=GRID):
+    """Device-side PWL evaluation: integer maths, C division (truncates to 0)."""
+    lo = np.clip(np.searchsorted(knots, x, side="right") - 1, 0, len(knots) - 2)
+    x0, x1 = knots[lo], knots[lo + 1]
+    v0, v1 = values[lo], values[lo + 1]
+    num = (v1 - v0) * (x - x0)
+    return v0 + np.sign(num) * (np.abs(num) // (x1 - x0))
+
+
+def fit_pwl(table, budget):
+    """Greedy knot insertion across both rows until `budget` bytes are spent.
+
+    Returns one sorted knot array per motion row (ldr positions; values
+    are read from the table at those positions).
+    """
+    rows = [[0, lut.LDR_LEVELS - 1] for _ in table]
+    max_knots = (budget - 2 * (len(table) + 1)) // KNOT_BYTES  # Minus LED_ROW_START
+    if max_knots < 2 * len(table):
+        raise ValueError(f"budget of {budget} bytes is too small for {len(table)} rows")
+
+    target = table.astype(np.int64)
+    errors = [np.abs(interpolate(np.array(r), target[m][r]) - target[m]) for m, r in enumerate(rows)]
+    while sum(map(len, rows)) < max_knots:
+        m = int(np.argmax([e.max() for e in errors]))
+        if errors[m].max() == 0:
+            break
+        x = int(np.argmax(errors[m]))
+        rows[m] = sorted(rows[m] + [x])
+        knots = np.array(rows[m])
+        errors[m] = np.abs(interpolate(knots, target[m][knots]) - target[m])
+    return [np.array(r) for r in rows]
+
+
+def pwl_table(table, rows):
+    return np.stack([interpolate(knots, table[m].astype(np.int64)[knots]) for m, knots in enumerate(rows)])
+
+
+# ============================================================
+# C output
+# ============================================================
+def c_array(ctype, name, values, per_line=16):
+    values = [str(int(v)) for v in np.asarray(values).reshape(-1)]
+    lines = [", ".join(values[i:i + per_line]) for i in range(0, len(values), per_line)]
+    return f"static const {ctype} {name}[{len(values)}] = {{\n  " + ",\n  ".join(lines) + "\n};\n"
+
+
+def header_table(table, version, source):
+    return f"""// Generated by export_header.py from {source} — do not edit.
+// Full response table: LED_LUT[motion * 4096 + ldr], {table.size} bytes.
+#pragma once
+#include <stdint.h>
+
+#define LED_MODEL_VERSION "{version}"
+
+{c_array("uint8_t", "LED_LUT", table)}
+static inline uint8_t ledPredict(int ldr, int motion) {{
+  if (ldr < 0) ldr = 0;
+  if (ldr > {lut.LDR_LEVELS - 1}) ldr = {lut.LDR_LEVELS - 1};
+  return LED_LUT[(motion ? {lut.LDR_LEVELS} : 0) + ldr];
+}}
+"""
+
+
+def header_pwl(table, rows, version, source):
+    starts = np.concatenate([[0], np.cumsum([len(r) for r in rows])])
+    knots = np.concatenate(rows)
+    values = np.concatenate([table[m][r] for m, r in enumerate(rows)])
+    nbytes = knots.size * KNOT_BYTES + starts.size * 2
+    return f"""// Generated by export_header.py from {source} — do not edit.
+// Piecewise-linear response: {knots.size} knots, {nbytes} bytes. Row `motion`
+// uses knots LED_ROW_START[motion] .. LED_ROW_START[motion + 1] - 1.
+#pragma once
+#include <stdint.h>
+
+#define LED_MODEL_VERSION "{version}"
+
+{c_array("uint16_t", "LED_ROW_START", starts)}
+{c_array("uint16_t", "LED_KNOT_LDR", knots, 12)}
+{c_array("uint8_t", "LED_KNOT_VALUE", values)}
+static inline uint8_t ledPredict(int ldr, int motion) {{
+  if (ldr < 0) ldr = 0;
+  if (ldr > {lut.LDR_LEVELS - 1}) ldr = {lut.LDR_LEVELS - 1};
+  int lo = LED_ROW_START[motion ? 1 : 0];
+  int hi = LED_ROW_START[motion ? 2 : 1] - 1;  // Rows start at ldr 0 and end at {lut.LDR_LEVELS - 1}
+  while (hi - lo > 1) {{
+    int mid = (lo + hi) / 2;
+    if (LED_KNOT_LDR[mid] <= ldr) lo = mid; else hi = mid;
+  }}
+  int32_t x0 = LED_KNOT_LDR[lo], x1 = LED_KNOT_LDR[hi];
+  int32_t v0 = LED_KNOT_VALUE[lo], v1 = LED_KNOT_VALUE[hi];
+  return (uint8_t)(v0 + (v1 - v0) * (ldr - x0) / (x1 - x0));
+}}
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export the LED model as an ESP32 C header.")
+    parser.add_argument("model", nargs="?", default="led_predictor.pkl")
+    parser.add_argument("--format", choices=("table", "pwl"), default="table")
+    parser.add_argument("--budget", type=int, default=1024, help="max bytes of PWL data")
+    parser.add_argument("--out", default="../led_model.h")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import joblib
+
+    args = parse_args()
+    model = joblib.load(args.model)
+    if model_features(model) != ("ldr", "motion"):
+        print(f"✗ {args.model} uses {', '.join(model_features(model))}; only (ldr, motion) models fit a table")
+        sys.exit(1)
+    table = lut.build_lut(model)
+    version = file_version(args.model)
+
+    if args.format == "table":
+        text, approx, nbytes = header_table(table, version, args.model), table, table.nbytes
+    else:
+        try:
+            rows = fit_pwl(table, args.budget)
+        except ValueError as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+        approx = pwl_table(table, rows)
+        nbytes = sum(map(len, rows)) * KNOT_BYTES + (len(rows) + 1) * 2
+        text = header_pwl(table, rows, version, args.model)
+
+    error = np.abs(approx.astype(int) - table.astype(int))
+    with open(args.out, "w") as f:
+        f.write(text)
+    print(f"✓ {args.format} header written to {args.out} (model version {version})")
+    print(f"  Data: {nbytes} bytes (full table {table.nbytes})")
+    print(f"  Error vs forest over all {table.size} inputs: max {error.max()}, "
+          f"mean {error.mean():.3f}, exact {np.mean(error == 0):.1%}")
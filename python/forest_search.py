@@ -0,0 +1,93 @@
+# ============================================================
+# forest_search.py  — Trees × depth search for train_model.py
+# ============================================================
+#
+# Fits one forest per depth with the largest tree count, then scores
+# every smaller tree count from cumulative per-tree predictions (the
+# first k trees of a random forest are themselves a valid forest), so
+# no forest is refit per point. Each configuration is also timed for
+# single-row and batch inference and measured for pickled size; the
+# smallest one whose test MAE is within `tolerance` of the best wins.
+#
+# Used by: python train_model.py --select [--mae-tolerance 0.5]
+
+import copy
+import pickle
+import warnings
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from compiled_forest import time_call
+
+DEPTHS = (4, 6, 8, 10, 12)
+TREE_COUNTS = (5, 10, 20, 50, 100, 200)
+BATCH_ROWS = 4096
+
+
+def sub_forest(forest, n_trees, n_jobs=None):
+    """The first `n_trees` trees as a standalone forest (no refit)."""
+    small = copy.copy(forest)
+    small.estimators_ = forest.estimators_[:n_trees]
+    small.n_estimators = n_trees
+    if n_jobs is not None:
+        small.n_jobs = n_jobs
+    return small
+
+
+def cumulative_mae(forest, X, y, tree_counts):
+    """Test MAE of the first k trees for every k in tree_counts."""
+    X = np.asarray(X, dtype=np.float32)
+    per_tree = np.stack([tree.predict(X) for tree in forest.estimators_[:max(tree_counts)]])
+    running = np.cumsum(per_tree, axis=0)
+    y = np.asarray(y, dtype=float)
+    return {k: float(np.mean(np.abs(np.clip(running[k - 1] / k, 0, 255) - y))) for k in tree_counts}
+
+
+def measure(model, X):
+    """Single-row µs, batch ms per BATCH_ROWS rows, pickled bytes (sklearn, n_jobs=1)."""
+    model = sub_forest(model, model.n_estimators, n_jobs=1)  # Thread dispatch would swamp 1-row timing
+    X = np.asarray(X, dtype=float)
+    row = X[:1]
+    batch = X[np.arange(BATCH_ROWS) % len(X)]
+    with warnings.catch_warnings():  # Bare arrays on purpose: time the trees, not column checks
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        return {
+            "row_us": time_call(lambda: model.predict(row), 20) * 1e6,
+            "batch_ms": time_call(lambda: model.predict(batch), 3) * 1e3,
+            "bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+        }
+
+
+def search(X_train, y_train, X_test, y_test, tolerance, depths=DEPTHS, tree_counts=TREE_COUNTS,
+           sample_weight=None, **forest_params):
+    """Evaluate the depth × tree-count grid. Returns (results, chosen forest)."""
+    forests, results = {}, []
+    for depth in depths:
+        forest = RandomForestRegressor(n_estimators=max(tree_counts), max_depth=depth, **forest_params)
+        forest.fit(X_train, y_train, sample_weight=sample_weight)
+        forests[depth] = forest
+        for k, mae in cumulative_mae(forest, X_test, y_test, tree_counts).items():
+            results.append({"depth": depth, "trees": k, "mae": mae,
+                            **measure(sub_forest(forest, k), X_test)})
+
+    best = min(r["mae"] for r in results)
+    for r in results:
+        r["pareto"] = not any(o["mae"] <= r["mae"] and o["bytes"] <= r["bytes"]
+                              and (o["mae"] < r["mae"] or o["bytes"] < r["bytes"]) for o in results)
+        r["eligible"] = r["mae"] <= best + tolerance
+    chosen = min((r for r in results if r["eligible"]), key=lambda r: (r["bytes"], r["mae"]))
+    chosen["chosen"] = True
+    return results, sub_forest(forests[chosen["depth"]], chosen["trees"])
+
+
+def print_report(results, tolerance):
+    best = min(r["mae"] for r in results)
+    print(f"\n{'depth':>5s} {'trees':>5s} {'test MAE':>9s} {'Δ best':>7s} {'size KB':>9s} "
+          f"{'1-row µs':>9s} {f'{BATCH_ROWS}-row ms':>12s}")
+    for r in sorted(results, key=lambda r: (r["depth"], r["trees"])):
+        flags = ("  ◀ chosen" if r.get("chosen") else "") or ("  pareto" if r["pareto"] else "")
+        print(f"{r['depth']:5d} {r['trees']:5d} {r['mae']:9.3f} {r['mae'] - best:+7.3f} "
+              f"{r['bytes'] / 1024:9.1f} {r['row_us']:9.0f} {r['batch_ms']:12.2f}{flags}")
+    print(f"\nTolerance: test MAE ≤ best ({best:.3f}) + {tolerance:g}; "
+          f"chose the smallest eligible model by pickled size.")
@@ -0,0 +1,282 @@
+# ============================================================
+# loadgen.py  — Fleet load generator emulating the ESP32 firmware
+# ============================================================
+#
+# Each simulated device follows esp32-ai-led.ino: GET /status every
+# 30 s to decide AI mode, and while AI mode is on, POST {"ldr","motion"}
+# to /predict once per 5 s loop. Like the firmware's HTTPClient, every
+# call opens a fresh TCP connection unless --keep-alive is given.
+# (Unlike the firmware, a device checks /status as soon as it boots
+# instead of waiting out the first 30 s, so short runs still predict.)
+#
+# Scenarios:
+#   steady     devices boot spread evenly over one predict interval
+#   reconnect  the whole fleet boots at once (power cut / AP restart)
+#   --burst-at 60,120  additionally drop every connection and resync
+#                      the whole fleet at those offsets (seconds)
+#
+# Usage (against a running app.py / serve.py):
+#   python loadgen.py --devices 2000 --duration 120 --scenario reconnect
+#   python loadgen.py --devices 10000 --keep-alive --json fleet.json
+# Large fleets need a raised file-descriptor limit (ulimit -n).
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+
+class Stats:
+    def __init__(self):
+        self.latency = {"/status": [], "/predict": []}  # seconds, successful calls
+        self.errors = {"/status": {}, "/predict": {}}  # kind → count
+        self.connects = 0
+
+    def error(self, path, kind):
+        self.errors[path][kind] = self.errors[path].get(kind, 0) + 1
+
+
+class Device:
+    def __init__(self, fleet, device_id):
+        self.fleet = fleet
+        self.device_id = device_id
+        self.rng = random.Random(device_id)
+        self.ldr = self.rng.uniform(0, 4095)
+        self.motion = 0
+        self.ai_mode = False
+        self.conn = None  # (reader, writer) when keep-alive is on
+
+    def read_sensors(self):
+        # Slow light drift with a few counts of ADC noise; PIR in short bursts
+        self.ldr = min(4095.0, max(0.0, self.ldr + self.rng.gauss(0, 40)))
+        self.motion = 1 if self.rng.random() < 0.15 else 0
+        return round(self.ldr + self.rng.gauss(0, 3)), self.motion
+
+    def drop_connection(self):
+        if self.conn is not None:
+            self.conn[1].close()
+            self.conn = None
+
+    async def call(self, method, path, body=None):
+        fleet, stats = self.fleet, self.fleet.stats
+        start = time.perf_counter()
+        try:
+            status, headers, data = await asyncio.wait_for(
+                self.request(method, path, body), fleet.timeout)
+        except asyncio.TimeoutError:
+            self.drop_connection()
+            stats.error(path, "timeout")
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            # Refused / reset, body cut short (IncompleteReadError), garbled status line
+            self.drop_connection()
+            stats.error(path, type(e).__name__)
+            return None
+
+        elapsed = time.perf_counter() - start
+        # A not-ready /status is a normal answer (the device stays in manual
+        # mode); anything else outside 2xx / 304 is a failure, as on the device
+        expected = 200 <= status < 300 or status == 304 or (
+            path == "/status" and status == 404 and data.strip() == b"not_ready")
+        if not expected:
+            stats.error(path, f"http_{status}")
+            return status
+        stats.latency[path].append(elapsed)
+        return status
+
+    async def request(self, method, path, body):
+        fleet = self.fleet
+        if self.conn is None:
+            self.conn = await asyncio.open_connection(fleet.host, fleet.port)
+            fleet.stats.connects += 1
+        reader, writer = self.conn
+
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {fleet.host}\r\n"
+                f"Connection: {'keep-alive' if fleet.keep_alive else 'close'}\r\n")
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+        writer.write(head.encode() + b"\r\n" + payload)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by server")
+        version, status = status_line.split()[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            data = await reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await reader.read()  # Body ends at connection close
+
+        reusable = (fleet.keep_alive and version == b"HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close")
+        if not reusable:
+            self.drop_connection()
+        return int(status), headers, data
+
+    async def check_model(self):
+        status = await self.call("GET", "/status")
+        self.ai_mode = status == 200
+
+    async def run(self, start_at):
+        fleet = self.fleet
+        await fleet.sleep_until(start_at)
+        next_status = start_at
+        while True:
+            now = fleet.now()
+            if now >= fleet.duration:
+                break
+            if now >= next_status:
+                await self.check_model()
+                next_status = now + fleet.status_interval
+            if self.ai_mode:
+                ldr, motion = self.read_sensors()
+                await self.call("POST", "/predict", {"ldr": ldr, "motion": motion})
+
+            # Firmware: delay(5000) after the loop body
+            wake = fleet.now() + fleet.jittered(fleet.predict_interval, self.rng)
+            burst = fleet.next_burst(fleet.now(), wake)
+            if burst is not None:
+                await fleet.sleep_until(burst + self.rng.uniform(0, fleet.burst_spread))
+                self.drop_connection()  # Reconnect storm: everyone re-dials
+                next_status = fleet.now()
+            else:
+                await fleet.sleep_until(min(wake, fleet.duration))
+        self.drop_connection()
+
+
+class Fleet:
+    def __init__(self, args):
+        url = urlsplit(args.url)
+        self.host = url.hostname or "127.0.0.1"
+        self.port = url.port or 80
+        self.devices = args.devices
+        self.duration = args.duration
+        self.predict_interval = args.predict_interval
+        self.status_interval = args.status_interval
+        self.jitter = args.jitter
+        self.keep_alive = args.keep_alive
+        self.timeout = args.timeout
+        self.scenario = args.scenario
+        self.bursts = sorted(args.burst_at)
+        self.burst_spread = args.burst_spread_ms / 1000.0
+        self.stats = Stats()
+        self.t0 = None
+
+    def now(self):
+        return time.perf_counter() - self.t0
+
+    async def sleep_until(self, t):
+        delay = t - self.now()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def jittered(self, interval, rng):
+        return interval * (1 + rng.uniform(-self.jitter, self.jitter))
+
+    def next_burst(self, after, until):
+        for b in self.bursts:
+            if after < b <= until:
+                return b
+        return None
+
+    async def run(self):
+        self.t0 = time.perf_counter()
+        rng = random.Random(0)
+        tasks = []
+        for i in range(self.devices):
+            if self.scenario == "reconnect":
+                start_at = rng.uniform(0, self.burst_spread)
+            else:
+                start_at = rng.uniform(0, self.predict_interval)
+            tasks.append(asyncio.create_task(Device(self, i).run(start_at)))
+        await asyncio.gather(*tasks)
+        return self.now()
+
+
+# ============================================================
+# Report
+# ============================================================
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def report(fleet, elapsed):
+    stats = fleet.stats
+    summary = {
+        "devices": fleet.devices,
+        "duration_s": round(elapsed, 2),
+        "scenario": fleet.scenario,
+        "keep_alive": fleet.keep_alive,
+        "connections_opened": stats.connects,
+        "endpoints": {},
+    }
+    for path, values in stats.latency.items():
+        values.sort()
+        errors = sum(stats.errors[path].values())
+        total = len(values) + errors
+        summary["endpoints"][path] = {
+            "requests": total,
+            "rps": round(total / elapsed, 1) if elapsed else 0.0,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "errors": stats.errors[path],
+            "p50_ms": None if not values else round(percentile(values, 50) * 1000, 2),
+            "p95_ms": None if not values else round(percentile(values, 95) * 1000, 2),
+            "p99_ms": None if not values else round(percentile(values, 99) * 1000, 2),
+        }
+
+    print(f"\n{fleet.devices} devices, {elapsed:.1f}s, scenario={fleet.scenario}, "
+          f"keep-alive={'on' if fleet.keep_alive else 'off'}, {stats.connects} connections")
+    print(f"{'endpoint':10s} {'requests':>9s} {'rps':>8s} {'err%':>7s} "
+          f"{'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    for path, e in summary["endpoints"].items():
+        fmt = lambda v: f"{v:8.2f}" if v is not None else f"{'-':>8s}"
+        print(f"{path:10s} {e['requests']:9d} {e['rps']:8.1f} {e['error_rate'] * 100:6.2f}% "
+              f"{fmt(e['p50_ms'])} {fmt(e['p95_ms'])} {fmt(e['p99_ms'])}")
+        if e["errors"]:
+            print(f"{'':10s} errors: {e['errors']}")
+    return summary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Emulate a fleet of ESP32 LED controllers.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds")
+    parser.add_argument("--predict-interval", type=float, default=5.0, help="firmware loop delay")
+    parser.add_argument("--status-interval", type=float, default=30.0)
+    parser.add_argument("--jitter", type=float, default=0.05, help="± fraction of each interval")
+    parser.add_argument("--keep-alive", action="store_true", help="reuse one connection per device")
+    parser.add_argument("--timeout", type=float, default=5.0, help="per-request timeout, seconds")
+    parser.add_argument("--scenario", choices=("steady", "reconnect"), default="steady")
+    parser.add_argument("--burst-at", type=lambda s: [float(x) for x in s.split(",") if x],
+                        default=[], help="comma-separated offsets for fleet-wide reconnects")
+    parser.add_argument("--burst-spread-ms", type=float, default=50.0,
+                        help="how tightly a burst is packed")
+    parser.add_argument("--json", help="write the summary to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    fleet = Fleet(args)
+    print(f"🚦 {args.devices} devices → {args.url} for {args.duration:g}s ({args.scenario})")
+    elapsed = asyncio.run(fleet.run())
+    summary = report(fleet, elapsed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\n✓ Summary written to {args.json}")
@@ -0,0 +1,109 @@
+# ============================================================
+# lut.py  — Precomputed response surface for the LED model
+# ============================================================
+#
+# The model only ever sees a 12-bit LDR reading (0–4095) and a
+# binary motion flag, so there are just 8192 possible inputs.
+# Evaluating the forest once over that grid gives a 8 KB uint8
+# table that answers /predict with a single index lookup.
+#
+# Usage (consistency check against a saved model):
+#   python lut.py [led_predictor.pkl]
+
+import gzip
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+LDR_LEVELS = 4096    # 12-bit ADC, same range train_model.py validates
+MOTION_LEVELS = 2    # PIR is 0 / 1
+
+# OTA blob served at /model/lut: 24-byte header, then the table row-major
+#   <4s magic "LUT1"><H ldr levels><B motion levels><B reserved>
+#   <12s model version, ASCII><I CRC-32 of the table bytes>
+BLOB_MAGIC = b"LUT1"
+BLOB_HEADER = struct.Struct("<4sHBx12sI")
+
+
+def grid_frame():
+    """All 8192 (ldr, motion) inputs, motion-major, as a model-ready DataFrame."""
+    import pandas as pd  # Deferred: keeps server start-up free of pandas
+    ldr = np.tile(np.arange(LDR_LEVELS, dtype=float), MOTION_LEVELS)
+    motion = np.repeat(np.arange(MOTION_LEVELS, dtype=float), LDR_LEVELS)
+    return pd.DataFrame({"ldr": ldr, "motion": motion})
+
+
+def build_lut(model):
+    """Evaluate the model over the full grid → uint8 table[motion, ldr]."""
+    preds = model.predict(grid_frame())
+    table = np.clip(preds, 0, 255).astype(np.uint8)
+    return table.reshape(MOTION_LEVELS, LDR_LEVELS)
+
+
+def on_grid(ldr, motion):
+    """Boolean mask of readings the table can answer exactly."""
+    ldr = np.asarray(ldr, dtype=float)
+    motion = np.asarray(motion, dtype=float)
+    return (
+        (ldr >= 0) & (ldr < LDR_LEVELS) & (ldr == np.floor(ldr))
+        & ((motion == 0) | (motion == 1))
+    )
+
+
+def lookup(table, ldr, motion):
+    """O(1) scalar lookup. Returns None for off-grid input (caller falls back)."""
+    if 0 <= ldr < LDR_LEVELS and ldr == int(ldr) and motion in (0, 1):
+        return int(table[int(motion), int(ldr)])
+    return None
+
+
+def verify_lut(model, table):
+    """Compare the table with live forest predictions over every input.
+
+    Returns the number of mismatching cells (0 means identical serving).
+    """
+    live = np.clip(model.predict(grid_frame()), 0, 255).astype(int)
+    return int(np.count_nonzero(live != table.reshape(-1).astype(int)))
+
+
+class LutBlob:
+    """A table encoded once for download: raw, gzip and zlib bodies + ETag."""
+
+    def __init__(self, table, version):
+        data = np.ascontiguousarray(table, dtype=np.uint8).tobytes()
+        self.crc = zlib.crc32(data)
+        self.raw = BLOB_HEADER.pack(BLOB_MAGIC, LDR_LEVELS, MOTION_LEVELS,
+                                    version.encode()[:12], self.crc) + data
+        self.encoded = {  # Content-Encoding → body; "deflate" is zlib-wrapped
+            "gzip": gzip.compress(self.raw, compresslevel=9, mtime=0),
+            "deflate": zlib.compress(self.raw, 9),
+        }
+        self.etag = f"{self.crc:08x}"  # Same table from a retrained model = no download
+
+
+def decode_blob(blob):
+    """Blob bytes → (version, table). ValueError if malformed or corrupt."""
+    magic, ldr_levels, motion_levels, version, crc = BLOB_HEADER.unpack_from(blob)
+    data = blob[BLOB_HEADER.size:]
+    if magic != BLOB_MAGIC or len(data) != ldr_levels * motion_levels:
+        raise ValueError("not a LUT blob")
+    if zlib.crc32(data) != crc:
+        raise ValueError("LUT checksum mismatch")
+    table = np.frombuffer(data, dtype=np.uint8).reshape(motion_levels, ldr_levels)
+    return version.rstrip(b"\0").decode(), table
+
+
+if __name__ == "__main__":
+    import joblib
+    path = sys.argv[1] if len(sys.argv) > 1 else "led_predictor.pkl"
+    model = joblib.load(path)
+    table = build_lut(model)
+    mismatches = verify_lut(model, table)
+
+    print(f"LUT: {table.size} cells, {table.nbytes} bytes")
+    if mismatches:
+        print(f"✗ {mismatches} cells differ from the live forest")
+        sys.exit(1)
+    print("✓ LUT matches the live forest on all inputs")
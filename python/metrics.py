@@ -0,0 +1,182 @@
+# ============================================================
+# metrics.py  — In-process request metrics in Prometheus format
+# ============================================================
+#
+# Recording is striped: each thread is dealt one of STRIPES small locks
+# round-robin on first use, so concurrent requests almost never contend. A scrape merges
+# the stripes and renders Prometheus text exposition format.
+
+import itertools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+STRIPES = 16
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HELP = {
+    "led_requests_total": ("counter", "HTTP requests by route and status code."),
+    "led_request_duration_seconds": ("histogram", "End-to-end request latency by route."),
+    "led_request_stage_seconds": ("histogram", "Per-stage latency inside a route handler."),
+    "led_predict_stage_seconds": ("histogram", "Inference internals: input frame build vs model call."),
+    "led_inflight_requests": ("gauge", "Requests currently being handled."),
+    "led_model_load_seconds": ("gauge", "Wall time of the last successful model load."),
+    "led_model_info": ("gauge", "Currently served model version, serving mode and model type."),
+    "led_startup_seconds": ("gauge", "Cold-start breakdown: imports, load, precompute, warm-up, ready."),
+    "led_process_memory_bytes": ("gauge", "This worker's memory from /proc/self/smaps_rollup."),
+    "led_registry_events_total": ("counter", "Per-device model registry hits, misses, loads and evictions."),
+    "led_registry_cached_bytes": ("gauge", "Estimated bytes of per-device models held in the LRU."),
+    "led_prediction_cache_total": ("counter", "Quantized prediction cache lookups by result (hit / miss)."),
+    "led_shadow_readings_total": ("counter", "Mirrored readings: candidate agrees, disagrees, or dropped."),
+    "led_shadow_predict_seconds": ("histogram", "Candidate model time per mirrored batch."),
+}
+SMAPS_FIELDS = {  # smaps_rollup line → `kind` label
+    "Rss": "rss", "Pss": "pss",
+    "Shared_Clean": "shared_clean", "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean", "Private_Dirty": "private_dirty",
+}
+
+
+class Stripe:
+    __slots__ = ("lock", "hist", "counters", "inflight")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hist = {}  # (name, labels) → [bucket counts..., +Inf count, sum]
+        self.counters = {}  # (name, labels) → int
+        self.inflight = 0
+
+
+stripes = [Stripe() for _ in range(STRIPES)]
+gauges = {}  # (name, labels) → float; plain assignment, last writer wins
+local = threading.local()
+next_stripe = itertools.count()  # next() is atomic under the GIL
+
+
+def stripe():
+    # Not get_ident() % STRIPES: idents are aligned pthread addresses, all ≡ 0
+    try:
+        return local.stripe
+    except AttributeError:
+        local.stripe = stripes[next(next_stripe) % STRIPES]
+        return local.stripe
+
+
+def observe(name, labels, seconds):
+    """Record one histogram sample. `labels` is a tuple of (key, value) pairs."""
+    s = stripe()
+    with s.lock:
+        entry = s.hist.get((name, labels))
+        if entry is None:
+            entry = s.hist[(name, labels)] = [0] * (len(BUCKETS) + 1) + [0.0]
+        entry[bisect_left(BUCKETS, seconds)] += 1
+        entry[-1] += seconds
+
+
+def inc(name, labels, amount=1):
+    s = stripe()
+    with s.lock:
+        s.counters[(name, labels)] = s.counters.get((name, labels), 0) + amount
+
+
+def inflight(delta):
+    s = stripe()
+    with s.lock:
+        s.inflight += delta
+
+
+def set_gauge(name, labels, value):
+    gauges[(name, labels)] = value
+
+
+def replace_gauge(name, labels, value):
+    """Set a gauge and drop its other label sets (e.g. an old model version)."""
+    for key in [k for k in list(gauges) if k[0] == name and k[1] != labels]:
+        gauges.pop(key, None)
+    gauges[(name, labels)] = value
+
+
+@contextmanager
+def timed(name, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, labels, time.perf_counter() - start)
+
+
+def process_memory(pid="self"):
+    """RSS vs shared/private bytes for a process (Linux only, else {})."""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in SMAPS_FIELDS:
+                    memory[SMAPS_FIELDS[key]] = int(rest.split()[0]) * 1024
+    except OSError:
+        pass
+    return memory
+
+
+# ============================================================
+# Exposition
+# ============================================================
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+def snapshot():
+    """Merge all stripes into (histograms, counters, inflight)."""
+    hist, counters, active = {}, {}, 0
+    for s in stripes:
+        with s.lock:
+            for key, entry in s.hist.items():
+                merged = hist.setdefault(key, [0] * len(entry[:-1]) + [0.0])
+                for i, v in enumerate(entry):
+                    merged[i] += v
+            for key, v in s.counters.items():
+                counters[key] = counters.get(key, 0) + v
+            active += s.inflight
+    return hist, counters, active
+
+
+def render():
+    hist, counters, active = snapshot()
+    by_name = {}
+    for (name, labels), v in counters.items():
+        by_name.setdefault(name, []).append(f"{name}{format_labels(labels)} {v}")
+    for (name, labels), entry in sorted(hist.items()):
+        lines = by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), entry[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels(labels, (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(labels)} {entry[-1]:.6f}")
+        lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+    by_name["led_inflight_requests"] = [f"led_inflight_requests {active}"]
+    pid = os.getpid()
+    by_name["led_process_memory_bytes"] = [
+        f"led_process_memory_bytes{format_labels((('pid', pid), ('kind', kind)))} {v}"
+        for kind, v in process_memory().items()
+    ]
+    for (name, labels), v in list(gauges.items()):
+        by_name.setdefault(name, []).append(f"{name}{format_labels(labels)} {v}")
+
+    out = []
+    for name, lines in by_name.items():
+        kind, text = HELP.get(name, ("untyped", name))
+        out.append(f"# HELP {name} {text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
@@ -0,0 +1,158 @@
+# ============================================================
+# model_registry.py  — Per-device models with a byte-bounded LRU
+# ============================================================
+#
+# A room can have its own model at MODEL_DIR/<device_id>.pkl; every
+# other device falls back to the global model the caller passes in.
+# Loaded per-device models live in an LRU cache bounded by an estimate
+# of their memory (pickle size + LUT / compiled arrays). Loads are
+# lazy and de-duplicated: concurrent requests for the same cold model
+# wait on one joblib.load instead of each doing their own.
+#
+# The directory is listed at most every INDEX_TTL seconds, so a request
+# for a device without its own model never touches the filesystem.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import metrics
+import model_store
+
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+REGISTRY_MAX_BYTES = int(float(os.environ.get("REGISTRY_MAX_MB", "512")) * 2**20)
+INDEX_TTL = float(os.environ.get("REGISTRY_INDEX_TTL", "10"))  # Seconds between dir scans
+FAILURE_TTL = float(os.environ.get("REGISTRY_FAILURE_TTL", "60"))  # Fallback after a bad file
+
+
+def estimate_bytes(served, path):
+    size = os.path.getsize(path)
+    if served.lut is not None:
+        size += served.lut.nbytes
+    if served.compiled is not None:
+        size += served.compiled.nbytes
+    return size
+
+
+class ModelRegistry:
+    def __init__(self, model_dir=MODEL_DIR, max_bytes=REGISTRY_MAX_BYTES):
+        self.model_dir = model_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index_lock = threading.Lock()
+        self.cache = OrderedDict()  # device_id → (served, nbytes, mtime_ns), LRU first
+        self.loading = {}  # device_id → Future of the in-flight load
+        self.failed = {}  # device_id → monotonic time until which we fall back
+        self.index = {}  # device_id → (path, mtime_ns)
+        self.index_at = float("-inf")
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "loads": 0, "load_failures": 0,
+                      "evictions": 0, "fallbacks": 0, "deduplicated": 0}
+
+    def count(self, event, n=1):
+        self.stats[event] += n
+        metrics.inc("led_registry_events_total", (("event", event),), n)
+
+    # ---------- index ----------
+    def refresh_index(self):
+        """Re-list MODEL_DIR if the cached listing is older than INDEX_TTL."""
+        if time.monotonic() - self.index_at < INDEX_TTL:
+            return
+        # Only the first scan makes others wait; later ones keep serving the old index
+        if not self.index_lock.acquire(blocking=self.index_at == float("-inf")):
+            return
+        try:
+            if time.monotonic() - self.index_at < INDEX_TTL:
+                return
+            index = {}
+            try:
+                with os.scandir(self.model_dir) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(".pkl") and entry.is_file():
+                            index[entry.name[:-4]] = (entry.path, entry.stat().st_mtime_ns)
+            except FileNotFoundError:
+                pass
+            self.index = index
+            self.index_at = time.monotonic()
+        finally:
+            self.index_lock.release()
+
+    # ---------- lookup ----------
+    def get(self, device_id, fallback):
+        """ServedModel for this device, or `fallback` if it has none."""
+        self.refresh_index()
+        device_id = str(device_id) if device_id else None
+        entry = self.index.get(device_id) if device_id else None
+        if entry is None or self.failed.get(device_id, 0) > time.monotonic():
+            self.count("fallbacks")
+            return fallback
+        path, mtime = entry
+
+        with self.lock:
+            cached = self.cache.get(device_id)
+            if cached is not None and cached[2] == mtime:
+                self.cache.move_to_end(device_id)
+                self.count("hits")
+                return cached[0]
+            future = self.loading.get(device_id)
+            owner = future is None
+            if owner:
+                future = self.loading[device_id] = Future()
+                self.count("misses")
+            else:
+                self.count("deduplicated")
+
+        if owner:
+            self.load(device_id, path, mtime, future)
+        served = future.result()
+        if served is None:
+            self.count("fallbacks")
+            return fallback
+        return served
+
+    def load(self, device_id, path, mtime, future):
+        served = None
+        try:
+            served = model_store.build_served_model(path)
+            nbytes = estimate_bytes(served, path)
+            self.count("loads")
+            print(f"📂 Loaded model for {device_id} (version {served.version}, {nbytes / 2**20:.1f} MB)")
+        except Exception as e:
+            self.count("load_failures")
+            self.failed[device_id] = time.monotonic() + FAILURE_TTL
+            print(f"⚠️ Error loading model for {device_id}: {e} (using global model for {FAILURE_TTL:g}s)")
+
+        with self.lock:
+            if served is not None:
+                old = self.cache.pop(device_id, None)
+                if old is not None:
+                    self.bytes -= old[1]
+                self.cache[device_id] = (served, nbytes, mtime)
+                self.bytes += nbytes
+                self.evict()
+                metrics.set_gauge("led_registry_cached_bytes", (), self.bytes)
+            del self.loading[device_id]
+        future.set_result(served)
+
+    def evict(self):
+        """Drop least-recently-used models until under the byte budget (lock held)."""
+        while self.bytes > self.max_bytes and len(self.cache) > 1:
+            device_id, (_, nbytes, _) = self.cache.popitem(last=False)
+            self.bytes -= nbytes
+            self.count("evictions")
+
+    def summary(self):
+        with self.lock:
+            entries, used = len(self.cache), self.bytes
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["deduplicated"]
+        return {
+            "model_dir": self.model_dir,
+            "device_models": len(self.index),
+            "cached": entries,
+            "cached_mb": round(used / 2**20, 2),
+            "max_mb": round(self.max_bytes / 2**20, 2),
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+            **self.stats,
+        }
@@ -0,0 +1,333 @@
+# ============================================================
+# model_store.py  — Loading, hot reload and serving of the model
+# ============================================================
+#
+# The served model is an immutable ServedModel bundle (forest + LUT /
+# compiled arrays + version). `current` is replaced by one assignment,
+# so a request that grabbed the old bundle finishes on it while new
+# requests see the new one. A background watcher polls the model file
+# and does all loading and warm-up off the request path.
+#
+# pandas / joblib / sklearn are imported on the loader thread, not at
+# module import, so the HTTP server can start listening immediately.
+
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+import device_state
+import lut
+import metrics
+import prediction_cache
+from compiled_forest import CompiledForest
+
+MODEL_PATH = "led_predictor.pkl"
+SERVING_MODE = os.environ.get("SERVING_MODE", "lut")  # "lut", "compiled" or "forest"
+LUT_VERIFY = os.environ.get("LUT_VERIFY", "0") == "1"  # Check LUT == forest on load
+WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "5"))  # Seconds, 0 = off
+RETRY_BASE = float(os.environ.get("MODEL_RETRY_BASE", "1"))  # First backoff after a failed load
+RETRY_MAX = float(os.environ.get("MODEL_RETRY_MAX", "60"))  # Backoff ceiling, seconds
+WARMUP_ROWS = int(os.environ.get("WARMUP_ROWS", "256"))
+
+current = None  # ServedModel; swapped atomically, never mutated
+load_lock = threading.Lock()
+blob_lock = threading.Lock()
+last_seen_stat = None  # (mtime_ns, size) of the file the watcher last handled
+load_failures = 0  # Consecutive failed loads
+retry_at = 0.0  # time.monotonic() before which loads are not retried
+startup = {}  # Start-up phase → seconds, filled by start_background_load()
+loader = None  # Start-up loader thread; request-path loads defer to it
+
+
+class ServedModel:
+    """A loaded model plus its precomputed fast paths. Read-only once built."""
+
+    def __init__(self, model, version, table=None, compiled=None):
+        self.model = model
+        self.version = version
+        self.lut = table
+        self.compiled = compiled
+        self.features = model_features(model)
+        self.stateful = any(f in device_state.FEATURES for f in self.features)
+        self.cache = None  # Optional PredictionCache for predict_one when there is no LUT
+        self.blob = None  # lut.LutBlob for /model/lut, built on first use
+        self.loaded_at = time.time()
+        self.timings = {}  # load / precompute / warmup seconds
+
+    @property
+    def mode(self):
+        if self.lut is not None:
+            return "lut"
+        return "compiled" if self.compiled is not None else "forest"
+
+    @property
+    def model_type(self):
+        """'forest', 'tree' or 'pwl' (distilled students, see distill.py)."""
+        if hasattr(self.model, "estimators_"):
+            return "forest"
+        if hasattr(self.model, "tree_"):
+            return "tree"
+        return getattr(self.model, "model_type", type(self.model).__name__)
+
+    def predict(self, ldr_values, motion_values, state=None):
+        """Predict clamped 0–255 ints for all readings (as a list)."""
+        return self.predict_array(ldr_values, motion_values, state).tolist()
+
+    def predict_array(self, ldr_values, motion_values, state=None):
+        """Predict clamped 0–255 values for all readings as a uint8 array.
+
+        On-grid readings come from the LUT (if loaded); the rest go through
+        one compiled-forest or model.predict call. `state` holds one array
+        per device_state.FEATURES and is only used by stateful models;
+        without it they see every reading as a device's first.
+        """
+        ldr = np.asarray(ldr_values, dtype=float)
+        motion = np.asarray(motion_values, dtype=float)
+        out = np.empty(len(ldr), dtype=np.uint8)
+
+        table = self.lut
+        hit = lut.on_grid(ldr, motion) if table is not None else np.zeros(len(ldr), dtype=bool)
+        if hit.any():
+            out[hit] = table[motion[hit].astype(int), ldr[hit].astype(int)]
+        if not hit.all():
+            miss = ~hit
+            evaluator = self.compiled if self.compiled is not None else self.model
+            stage = "compiled" if self.compiled is not None else "forest"
+            with metrics.timed("led_predict_stage_seconds", (("stage", "frame"),)):
+                columns = {"ldr": ldr, "motion": motion}
+                if self.stateful:
+                    extra = state if state is not None else device_state.cold_features(ldr, motion)
+                    columns.update(zip(device_state.FEATURES, extra))
+                if self.compiled is not None:
+                    X = np.column_stack([np.asarray(columns[f], dtype=float)[miss] for f in self.features])
+                else:
+                    import pandas as pd
+                    X = pd.DataFrame({f: np.asarray(columns[f], dtype=float)[miss] for f in self.features})
+            with metrics.timed("led_predict_stage_seconds", (("stage", stage),)):
+                preds = evaluator.predict(X)
+            out[miss] = np.clip(preds, 0, 255).astype(int)
+        return out
+
+    def lut_blob(self):
+        """Downloadable table for this model, encoded once. None for stateful models."""
+        if self.blob is None and not self.stateful:
+            with blob_lock:
+                if self.blob is None:
+                    table = self.lut if self.lut is not None else lut.build_lut(self.model)
+                    self.blob = lut.LutBlob(table, self.version)
+        return self.blob
+
+    def predict_one(self, ldr, motion, state=None):
+        if self.stateful:
+            return self.predict([ldr], [motion], None if state is None else [[v] for v in state])[0]
+        if self.lut is not None:
+            pred = lut.lookup(self.lut, ldr, motion)
+        elif self.cache is not None:
+            pred = self.cache.get(ldr, motion)
+        else:
+            pred = None
+        if pred is None:
+            pred = self.predict([ldr], [motion])[0]
+        return pred
+
+
+def model_features(model):
+    """Input columns the model was fitted on, in order."""
+    names = getattr(model, "feature_names_in_", None)
+    return tuple(names) if names is not None else ("ldr", "motion")
+
+
+def file_version(path):
+    """Short content hash of a model file, used as the model version."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def warm_up(served, rows=WARMUP_ROWS):
+    """Run single-row and batch predictions so first-call costs are paid now."""
+    rng = np.random.default_rng(0)
+    ldr = rng.integers(0, lut.LDR_LEVELS, rows).astype(float)
+    motion = rng.integers(0, lut.MOTION_LEVELS, rows).astype(float)
+    ldr[::2] += 0.5  # Off-grid half exercises the forest / compiled fallback
+    served.predict(ldr, motion)
+    served.predict_one(float(ldr[0]), float(motion[0]))
+    served.predict_one(float(ldr[1]), float(motion[1]))
+
+
+def build_served_model(path=MODEL_PATH):
+    """Load, precompute and warm a model file. Does not touch `current`."""
+    import joblib
+
+    start = time.perf_counter()
+    version = file_version(path)
+    loaded = joblib.load(path)
+    loaded_at = time.perf_counter()
+
+    # The 8192-cell grid only covers (ldr, motion); stateful models get the
+    # compiled forest instead
+    stateful = any(f in device_state.FEATURES for f in model_features(loaded))
+    table = lut.build_lut(loaded) if SERVING_MODE == "lut" and not stateful else None
+    if table is not None and LUT_VERIFY:
+        mismatches = lut.verify_lut(loaded, table)
+        if mismatches:
+            print(f"⚠️ LUT differs from forest in {mismatches} cells, serving forest")
+            table = None
+        else:
+            print("✅ LUT verified against forest")
+    compilable = hasattr(loaded, "estimators_") or hasattr(loaded, "tree_")  # Not a PWL student
+    wants_compiled = SERVING_MODE == "compiled" or (SERVING_MODE == "lut" and stateful)
+    compiled = CompiledForest(loaded) if compilable and wants_compiled else None
+    precomputed_at = time.perf_counter()
+
+    served = ServedModel(loaded, version, table, compiled)
+    if table is None and not stateful and prediction_cache.CACHE_BUCKET > 0:
+        served.cache = prediction_cache.PredictionCache(served.predict)
+    warm_up(served)
+    if table is not None:
+        served.lut_blob()  # Cheap with the table at hand; first download then costs nothing
+    served.timings = {
+        "load": loaded_at - start,
+        "precompute": precomputed_at - loaded_at,
+        "warmup": time.perf_counter() - precomputed_at,
+    }
+    return served
+
+
+# ============================================================
+# Load / swap
+# ============================================================
+def retry_after():
+    """Seconds until the next load attempt is allowed (0 if allowed now)."""
+    return max(0.0, retry_at - time.monotonic())
+
+
+def record_failure(reason):
+    """Negative-cache a failed load with exponential backoff."""
+    global load_failures, retry_at
+    load_failures += 1
+    backoff = min(RETRY_BASE * 2 ** (load_failures - 1), RETRY_MAX)
+    retry_at = time.monotonic() + backoff
+    print(f"{reason} (attempt {load_failures}, next retry in {backoff:g}s)")
+
+
+def load_model(force=False):
+    """Load MODEL_PATH and swap it in. Returns True on success.
+
+    Request-path callers (force=False) get an immediate False while a
+    previous failure is still in its backoff window or while another
+    thread is mid-load (they never wait on a load), and skip the load if
+    another thread already finished one. The watcher passes force=True
+    because a changed file deserves a fresh attempt; a forced load still
+    skips a file whose version is already being served.
+    """
+    global current, load_failures, retry_at
+    if not force and (retry_after() > 0 or (loader is not None and loader.is_alive())):
+        return False
+    if not load_lock.acquire(blocking=force):
+        return current is not None
+
+    try:
+        if not force:
+            if current is not None:
+                return True
+            if retry_after() > 0:
+                return False
+
+        if not os.path.exists(MODEL_PATH):
+            record_failure("❌ Model file not found yet.")
+            return False
+        if force and current is not None and current.version == file_version(MODEL_PATH):
+            return True  # The watcher queued behind the start-up loader for the same file
+        try:
+            start = time.perf_counter()
+            served = build_served_model(MODEL_PATH)
+            load_seconds = time.perf_counter() - start
+        except Exception as e:
+            record_failure(f"⚠️ Error loading model: {e}")
+            return False
+
+        current = served
+        metrics.set_gauge("led_model_load_seconds", (), round(load_seconds, 6))
+        metrics.replace_gauge("led_model_info", (("version", served.version), ("mode", served.mode),
+                                                 ("type", served.model_type)), 1)
+        load_failures, retry_at = 0, 0.0
+        print(f"✅ Model loaded successfully: {MODEL_PATH} (version {served.version})")
+        return True
+    finally:
+        load_lock.release()
+
+
+def check_for_update():
+    """Reload if the model file changed on disk. Returns True if swapped."""
+    global last_seen_stat
+    if loader is not None and loader.is_alive():
+        return False  # Start-up load in progress; look again next tick
+    try:
+        st = os.stat(MODEL_PATH)
+    except FileNotFoundError:
+        return False
+
+    stat_key = (st.st_mtime_ns, st.st_size)
+    if stat_key == last_seen_stat:
+        return False
+    last_seen_stat = stat_key
+
+    version = file_version(MODEL_PATH)
+    served = current
+    if served is not None and served.version == version:
+        return False  # Touched but identical content
+
+    print(f"🔄 Model file changed (version {version}), reloading...")
+    return load_model(force=True)
+
+
+# ============================================================
+# Start-up
+# ============================================================
+def background_load(boot):
+    """Import heavy deps, load and warm the model, record the breakdown."""
+    start = time.perf_counter()
+    import joblib, pandas, sklearn.ensemble  # noqa: F401 — timed separately
+    startup["model_imports"] = time.perf_counter() - start
+
+    if load_model(force=True):
+        startup.update(current.timings)
+        startup["ready"] = time.perf_counter() - boot
+        for phase, seconds in startup.items():
+            metrics.set_gauge("led_startup_seconds", (("phase", phase),), round(seconds, 6))
+        print("⏱️ Start-up: " + ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in startup.items()))
+
+
+def start_background_load(boot):
+    """Load the model off the main thread; /status turns ready once warm."""
+    global loader
+    loader = threading.Thread(target=background_load, args=(boot,), daemon=True,
+                              name="model-loader")
+    loader.start()
+    return loader
+
+
+def watch_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            check_for_update()
+        except Exception as e:
+            print("⚠️ Model watcher error:", e)
+
+
+def start_watcher(interval=WATCH_INTERVAL):
+    """Start the background file watcher (no-op when interval is 0)."""
+    if interval <= 0:
+        return None
+    thread = threading.Thread(target=watch_loop, args=(interval,), daemon=True,
+                              name="model-watcher")
+    thread.start()
+    print(f"👀 Watching {MODEL_PATH} for changes every {interval:g}s")
+    return thread
@@ -0,0 +1,210 @@
+# ============================================================
+# mqtt_service.py  — MQTT-native inference (no HTTP per reading)
+# ============================================================
+#
+# Runs next to app.py. Subscribes to device telemetry on a broker,
+# predicts brightness for each reading and publishes it back on a
+# per-device topic, so one process serves the fleet over pub/sub.
+#
+#   devices/<id>/telemetry   ← {"ldr": 812, "motion": 1, ...}   (device)
+#   devices/<id>/attributes  → {"shared": {"led": 143}}         (service)
+#
+# The reply uses the same {"shared": {"led": ...}} shape the firmware's
+# onMqttMessage() already parses. Readings are drained in micro-batches
+# so a burst costs one vectorized predict. Model loading and hot reload
+# come from model_store, exactly as in app.py.
+#
+# Usage:
+#   pip install paho-mqtt
+#   MQTT_HOST=192.168.1.100 python mqtt_service.py
+#   python mqtt_service.py --self-test     # in-process broker, no network
+
+import json
+import os
+import queue
+import sys
+import time
+
+import model_store
+from device_state import DeviceState
+from model_registry import ModelRegistry
+
+MQTT_HOST = os.environ.get("MQTT_HOST", "127.0.0.1")
+MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
+MQTT_USERNAME = os.environ.get("MQTT_USERNAME")
+MQTT_PASSWORD = os.environ.get("MQTT_PASSWORD")
+TELEMETRY_TOPIC = os.environ.get("MQTT_TELEMETRY_TOPIC", "devices/+/telemetry")
+RESULT_TOPIC = os.environ.get("MQTT_RESULT_TOPIC", "devices/{device_id}/attributes")
+MAX_BATCH = int(os.environ.get("MQTT_MAX_BATCH", "256"))
+LDR_MAX = 4095  # 12-bit ADC
+
+
+def topic_matches(pattern, topic):
+    """MQTT wildcard match ('+' = one level, '#' = the rest)."""
+    p_parts, t_parts = pattern.split("/"), topic.split("/")
+    for i, p in enumerate(p_parts):
+        if p == "#":
+            return True
+        if i >= len(t_parts) or (p != "+" and p != t_parts[i]):
+            return False
+    return len(p_parts) == len(t_parts)
+
+
+def device_id_from_topic(pattern, topic):
+    """The topic level matched by the pattern's first '+'."""
+    parts = topic.split("/")
+    for i, p in enumerate(pattern.split("/")):
+        if p == "+" and i < len(parts):
+            return parts[i]
+    return topic
+
+
+class InferenceService:
+    def __init__(self, publish, telemetry_topic=TELEMETRY_TOPIC,
+                 result_topic=RESULT_TOPIC, max_batch=MAX_BATCH):
+        self.publish = publish  # callable(topic, payload_bytes)
+        self.telemetry_topic = telemetry_topic
+        self.result_topic = result_topic
+        self.max_batch = max_batch
+        self.queue = queue.SimpleQueue()
+        self.registry = ModelRegistry()
+        self.device_state = DeviceState()  # Rolling features for stateful models, by topic device id
+        self.stats = {"received": 0, "predicted": 0, "invalid": 0, "no_model": 0, "errors": 0, "batches": 0}
+
+    def on_telemetry(self, topic, payload):
+        """Called on the MQTT network thread: parse and enqueue only."""
+        self.stats["received"] += 1
+        try:
+            data = json.loads(payload)
+            reading = (device_id_from_topic(self.telemetry_topic, topic),
+                       float(data["ldr"]), float(data.get("motion", 0)))
+            # Range checks also reject NaN and inf (json.loads accepts both)
+            if not (0 <= reading[1] <= LDR_MAX and 0 <= reading[2] <= 1):
+                raise ValueError("reading out of range")
+        except (ValueError, KeyError, TypeError):
+            self.stats["invalid"] += 1
+            return
+        self.queue.put(reading)
+
+    def drain(self, block=True, timeout=None):
+        """Predict and publish one micro-batch. Returns readings handled."""
+        try:
+            batch = [self.queue.get(block=block, timeout=timeout)]
+        except queue.Empty:
+            return 0
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        served = model_store.current
+        if served is None and model_store.load_model():
+            served = model_store.current
+        if served is None:
+            self.stats["no_model"] += len(batch)
+            return len(batch)
+
+        groups = {}  # id(ServedModel) → (model, readings); per-device models from MODEL_DIR
+        for reading in batch:
+            model = self.registry.get(reading[0], served)
+            groups.setdefault(id(model), (model, []))[1].append(reading)
+        for model, readings in groups.values():
+            try:
+                ldr, motion = [r[1] for r in readings], [r[2] for r in readings]
+                state = None
+                if model.stateful:  # A device's readings are all in its model's group, in arrival order
+                    state = self.device_state.update_many([r[0] for r in readings], ldr, motion)
+                preds = model.predict(ldr, motion, state)
+                for (device_id, _, _), led in zip(readings, preds):
+                    topic = self.result_topic.format(device_id=device_id)
+                    self.publish(topic, json.dumps({"shared": {"led": led}}).encode())
+            except Exception as e:  # One group failing must not stop the service
+                print(f"❌ MQTT batch of {len(readings)} failed: {e}")
+                self.stats["errors"] += len(readings)
+                continue
+            self.stats["predicted"] += len(readings)
+        self.stats["batches"] += 1
+        return len(batch)
+
+    def run_forever(self):
+        while True:
+            self.drain()
+
+
+class InProcessBroker:
+    """Minimal stand-in broker: synchronous fan-out with MQTT wildcards."""
+
+    def __init__(self):
+        self.subscriptions = []  # (pattern, callback(topic, payload))
+
+    def subscribe(self, pattern, callback):
+        self.subscriptions.append((pattern, callback))
+
+    def publish(self, topic, payload):
+        for pattern, callback in self.subscriptions:
+            if topic_matches(pattern, topic):
+                callback(topic, payload)
+
+
+# ============================================================
+# Run against a real broker (paho-mqtt)
+# ============================================================
+def run_paho():
+    import paho.mqtt.client as mqtt  # Install with: pip install paho-mqtt
+
+    try:
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)  # paho-mqtt ≥ 2.0
+    except AttributeError:
+        client = mqtt.Client()
+    if MQTT_USERNAME:
+        client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+
+    service = InferenceService(lambda topic, payload: client.publish(topic, payload))
+
+    def on_connect(client, userdata, *args):
+        client.subscribe(TELEMETRY_TOPIC)  # (Re)subscribe on every reconnect
+        print(f"📡 Connected to {MQTT_HOST}:{MQTT_PORT}, subscribed to {TELEMETRY_TOPIC}")
+
+    client.on_connect = on_connect
+    client.on_message = lambda client, userdata, msg: service.on_telemetry(msg.topic, msg.payload)
+    client.connect(MQTT_HOST, MQTT_PORT)
+    client.loop_start()  # Network I/O on paho's thread, inference on this one
+    service.run_forever()
+
+
+def self_test():
+    """Round-trip a few readings through the in-process broker."""
+    if not model_store.load_model():
+        sys.exit(1)
+    broker = InProcessBroker()
+    service = InferenceService(broker.publish)
+    broker.subscribe(TELEMETRY_TOPIC, service.on_telemetry)
+
+    replies = {}
+    broker.subscribe(RESULT_TOPIC.format(device_id="+"),
+                     lambda topic, payload: replies.update({topic: json.loads(payload)}))
+
+    readings = {"room-1": (100, 1), "room-2": (3000, 0), "room-3": (1500.5, 1)}
+    for device_id, (ldr, motion) in readings.items():
+        topic = TELEMETRY_TOPIC.replace("+", device_id)
+        broker.publish(topic, json.dumps({"ldr": ldr, "motion": motion, "led": 0}).encode())
+    service.drain(block=False)
+
+    ok = True
+    for device_id, (ldr, motion) in readings.items():
+        got = replies.get(RESULT_TOPIC.format(device_id=device_id), {}).get("shared", {}).get("led")
+        want = model_store.current.predict_one(float(ldr), float(motion))
+        ok &= got == want
+        print(f"{'✓' if got == want else '✗'} {device_id}: LDR={ldr}, Motion={motion} → {got} (HTTP path {want})")
+    print(f"\nStats: {service.stats}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    if "--self-test" in sys.argv:
+        self_test()
+    print("🚀 Starting MQTT inference service...")
+    model_store.start_background_load(time.perf_counter())
+    model_store.start_watcher()
+    run_paho()
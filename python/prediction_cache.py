@@ -0,0 +1,134 @@
+# ============================================================
+# prediction_cache.py  — Quantized LRU cache of single predictions
+# ============================================================
+#
+# For serving modes without a LUT (compiled / forest), consecutive
+# readings from a device differ by a few ADC counts and hit the same
+# forest evaluation again and again. The cache quantizes LDR into
+# buckets of PREDICTION_CACHE_BUCKET counts and stores one prediction
+# per (bucket, motion), evaluated at the bucket's midpoint so the value
+# does not depend on which request filled it. Each ServedModel gets its
+# own cache, so a model reload starts from an empty one.
+#
+# Usage (accuracy and hit rate per bucket width):
+#   python prediction_cache.py [led_predictor.pkl] [--buckets 1,2,4,8,16,32]
+
+import argparse
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import lut
+import metrics
+
+CACHE_BUCKET = int(os.environ.get("PREDICTION_CACHE_BUCKET", "0"))  # LDR counts per bucket, 0 = off
+CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "2048"))  # Entries (8192 / bucket covers all)
+
+
+class PredictionCache:
+    def __init__(self, predict, bucket=CACHE_BUCKET, max_entries=CACHE_SIZE):
+        self.predict = predict  # callable(ldr_values, motion_values) → list of ints
+        self.bucket = bucket
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (bucket index, motion) → prediction, LRU first
+        self.hits = self.misses = self.evictions = 0
+
+    def representative(self, index):
+        return min(index * self.bucket + self.bucket // 2, lut.LDR_LEVELS - 1)
+
+    def get(self, ldr, motion):
+        """Cached prediction, or None for readings outside the 12-bit grid."""
+        if not (0 <= ldr < lut.LDR_LEVELS and motion in (0, 1)):
+            return None
+        key = (int(ldr) // self.bucket, int(motion))
+        with self.lock:
+            pred = self.entries.get(key)
+            if pred is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if pred is not None:
+            metrics.inc("led_prediction_cache_total", (("result", "hit"),))
+            return pred
+
+        pred = self.predict([float(self.representative(key[0]))], [float(key[1])])[0]
+        metrics.inc("led_prediction_cache_total", (("result", "miss"),))
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = pred
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return pred
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "bucket": self.bucket,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+# ============================================================
+# Accuracy / hit-rate report per bucket width
+# ============================================================
+def quantized_table(table, bucket):
+    """What the cache would answer for every grid input, as table[motion, ldr]."""
+    ldr = np.arange(lut.LDR_LEVELS)
+    reps = np.minimum(ldr // bucket * bucket + bucket // 2, lut.LDR_LEVELS - 1)
+    return table[:, reps]
+
+
+def jitter_trace(devices, steps, jitter, seed=0):
+    """(ldr, motion) per device every sample: slow drift plus ±jitter ADC noise."""
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(200, 3800, devices)
+    motion = rng.integers(0, 2, devices)
+    for _ in range(steps):
+        base = np.clip(base + rng.normal(0, 2, devices), 0, lut.LDR_LEVELS - 1)
+        flip = rng.random(devices) < 0.05
+        motion = np.where(flip, 1 - motion, motion)
+        noise = rng.integers(-jitter, jitter + 1, devices)
+        ldr = np.clip(np.round(base) + noise, 0, lut.LDR_LEVELS - 1)
+        yield from zip(ldr.tolist(), motion.tolist())
+
+
+def report(model_path, buckets, devices, steps, jitter, max_entries):
+    import joblib
+
+    table = lut.build_lut(joblib.load(model_path)).astype(int)
+    trace = list(jitter_trace(devices, steps, jitter))
+    print(f"Trace: {devices} devices × {steps} samples, ±{jitter} ADC jitter, "
+          f"cache of {max_entries} entries\n")
+    print(f"{'bucket':>6s} {'max |Δ|':>8s} {'mean |Δ|':>9s} {'changed':>8s} {'hit rate':>9s}")
+    for bucket in buckets:
+        error = np.abs(quantized_table(table, bucket) - table)
+        cache = PredictionCache(lambda l, m: [int(table[int(m[0]), int(l[0])])], bucket, max_entries)
+        for ldr, motion in trace:
+            cache.get(ldr, motion)
+        print(f"{bucket:6d} {error.max():8d} {error.mean():9.3f} {np.mean(error > 0):8.1%} "
+              f"{cache.stats()['hit_rate']:9.1%}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Accuracy vs hit rate of the quantized prediction cache.")
+    parser.add_argument("model", nargs="?", default="led_predictor.pkl")
+    parser.add_argument("--buckets", default="1,2,4,8,16,32,64")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--jitter", type=int, default=3, help="± ADC counts of sample noise")
+    parser.add_argument("--size", type=int, default=CACHE_SIZE, help="cache entries")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report(args.model, [int(b) for b in args.buckets.split(",")], args.devices, args.steps,
+           args.jitter, args.size)
@@ -0,0 +1,97 @@
+# ============================================================
+# request_log.py  — Per-request logging kept off the hot path
+# ============================================================
+#
+# LOG_MODE=print (default) keeps the original console lines.
+# LOG_MODE=json hands records to a QueueHandler; a background
+# QueueListener thread formats them as JSON lines and writes stdout,
+# so a slow log driver never blocks a request. Predictions are sampled
+# 1-in-LOG_SAMPLE_EVERY; errors are always logged.
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_MODE = os.environ.get("LOG_MODE", "print")  # "print" or "json"
+LOG_SAMPLE_EVERY = max(1, int(os.environ.get("LOG_SAMPLE_EVERY", "1")))
+
+logger = logging.getLogger("led.requests")
+listener = None
+sample_counter = itertools.count()  # next() is atomic under the GIL
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+def setup():
+    """Start the background listener (json mode only). Safe to call twice."""
+    global listener
+    if LOG_MODE != "json" or listener is not None:
+        return
+
+    for handler in [h for h in logger.handlers if isinstance(h, QueueHandler)]:
+        logger.removeHandler(handler)
+    records = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonLineFormatter())
+    listener = QueueListener(records, stream)
+    listener.start()
+    atexit.register(listener.stop)  # Flush what is queued on shutdown
+
+    logger.addHandler(QueueHandler(records))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def restart_after_fork():
+    """The listener thread stays behind in the parent; start a fresh one."""
+    global listener
+    if listener is not None:
+        listener = None
+        setup()
+
+
+os.register_at_fork(after_in_child=restart_after_fork)
+
+
+def prediction(device_id, ldr, motion, led, version, latency_ms):
+    if LOG_MODE != "json":
+        print(f"📥 Input: LDR={ldr}, Motion={motion} → Predicted LED={led}")
+        return
+    if next(sample_counter) % LOG_SAMPLE_EVERY:
+        return
+    logger.info("prediction", extra={"fields": {
+        "device_id": device_id, "ldr": ldr, "motion": motion, "led": led,
+        "model_version": version, "latency_ms": round(latency_ms, 3),
+    }})
+
+
+def batch(count, version, latency_ms):
+    if LOG_MODE != "json":
+        print(f"📦 Batch: {count} readings predicted")
+        return
+    if next(sample_counter) % LOG_SAMPLE_EVERY:
+        return
+    logger.info("batch", extra={"fields": {
+        "count": count, "model_version": version, "latency_ms": round(latency_ms, 3),
+    }})
+
+
+def error(event, exc, **fields):
+    if LOG_MODE != "json":
+        print(f"⚠️ {event}:", exc)
+        return
+    logger.error(event, extra={"fields": {"error": str(exc), **fields}})
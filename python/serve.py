@@ -0,0 +1,83 @@
+# ============================================================
+# serve.py  — Multi-worker production server (gunicorn, pre-fork)
+# ============================================================
+#
+# The parent process imports app.py and loads the model (forest + LUT /
+# compiled arrays) once, then freezes the GC so every object allocated
+# so far moves to the permanent generation. Workers are forked after
+# that and share those pages copy-on-write: with collection disabled
+# in the parent and frozen objects never scanned, refcount/GC traffic
+# stops dirtying the shared model memory.
+#
+# Usage:
+#   pip install gunicorn
+#   WORKERS=8 THREADS=4 python serve.py
+#
+# Each worker logs its RSS / shared / private split once it is up, and
+# /metrics reports it live (led_process_memory_bytes). A model reload
+# inside a worker gives that worker a private copy until the next
+# restart; redeploy with `kill -HUP <parent pid>` to re-share.
+
+import gc
+import os
+
+from gunicorn.app.base import BaseApplication
+
+BIND = os.environ.get("BIND", "0.0.0.0:5000")
+WORKERS = int(os.environ.get("WORKERS", str(os.cpu_count() or 1)))
+THREADS = int(os.environ.get("THREADS", "4"))
+
+
+def format_memory(memory):
+    mb = {k: v / 2**20 for k, v in memory.items()}
+    shared = mb.get("shared_clean", 0) + mb.get("shared_dirty", 0)
+    private = mb.get("private_clean", 0) + mb.get("private_dirty", 0)
+    return (f"RSS {mb.get('rss', 0):.1f} MB = shared {shared:.1f} MB + private {private:.1f} MB "
+            f"(PSS {mb.get('pss', 0):.1f} MB)")
+
+
+def post_fork(server, worker):
+    gc.enable()  # Collect again, but frozen parent objects are never scanned
+    import model_store
+    model_store.start_watcher()
+
+
+def post_worker_init(worker):
+    import metrics
+    print(f"🧠 Worker {os.getpid()}: {format_memory(metrics.process_memory())}")
+
+
+class PreforkServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        gc.disable()  # No collections between load and fork
+        import app
+        import metrics
+        import model_store
+        model_store.load_model()
+
+        gc.collect()
+        gc.freeze()
+        print(f"❄️ Parent {os.getpid()}: model loaded, {gc.get_freeze_count()} objects frozen, "
+              f"{format_memory(metrics.process_memory())}")
+        return app.app
+
+
+if __name__ == "__main__":
+    print(f"🚀 Starting {WORKERS} workers × {THREADS} threads on {BIND}...")
+    PreforkServer({
+        "bind": BIND,
+        "workers": WORKERS,
+        "threads": THREADS,
+        "worker_class": "gthread",
+        "preload_app": True,
+        "post_fork": post_fork,
+        "post_worker_init": post_worker_init,
+    }).run()
@@ -0,0 +1,174 @@
+# ============================================================
+# shadow.py  — Shadow evaluation of a candidate model
+# ============================================================
+#
+# Set SHADOW_MODEL_PATH to a retrained model file and every live
+# prediction is mirrored to it: the request thread only does a
+# non-blocking put of (inputs, live answer) on a bounded queue and
+# returns. A worker thread loads the candidate, evaluates the mirrored
+# readings in batches and records how far it disagrees with the live
+# model and how long it takes. When the queue is full, readings are
+# dropped (and counted) rather than slowing the live path.
+# Candidates with per-device state features are refused: the mirrored
+# readings carry no device history to evaluate them fairly.
+#
+# Promote a candidate by renaming it over led_predictor.pkl; the
+# model_store watcher hot-reloads it.
+
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+import metrics
+import model_store
+import wire_format
+
+SHADOW_MODEL_PATH = os.environ.get("SHADOW_MODEL_PATH", "")  # Empty = shadowing off
+SHADOW_QUEUE_MAX = int(os.environ.get("SHADOW_QUEUE_MAX", "10000"))  # Mirrored requests, then drop
+SHADOW_MAX_BATCH = int(os.environ.get("SHADOW_MAX_BATCH", "512"))  # Readings per candidate call
+SHADOW_CHECK_INTERVAL = 5.0  # Seconds between candidate file stats
+
+
+class ShadowEvaluator:
+    def __init__(self, path=SHADOW_MODEL_PATH, max_queue=SHADOW_QUEUE_MAX, max_batch=SHADOW_MAX_BATCH):
+        self.path = path
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.candidate = None  # ServedModel, loaded on the worker thread
+        self.candidate_stat = None
+        self.start()
+        # Threads do not survive fork: pre-forked workers get their own
+        os.register_at_fork(after_in_child=self.start)
+
+    def start(self):
+        self.queue = queue.Queue(maxsize=self.max_queue)
+        self.stats_lock = threading.Lock()
+        self.disagreement = Counter()  # |candidate − live| bucket → readings
+        self.counts = {"mirrored": 0, "evaluated": 0, "dropped": 0, "higher": 0, "lower": 0}
+        self.diff_sum = 0
+        self.predict_seconds = 0.0
+        self.batches = 0
+        self.thread = threading.Thread(target=self.run, daemon=True, name="shadow-eval")
+        self.thread.start()
+
+    # ---------- live path ----------
+    def mirror(self, ldr, motion, live):
+        """Queue readings and the live answers for them; never blocks."""
+        try:
+            self.queue.put_nowait((ldr, motion, live))
+        except queue.Full:
+            self.counts["dropped"] += np.size(live)
+            metrics.inc("led_shadow_readings_total", (("result", "dropped"),), int(np.size(live)))
+
+    def mirror_one(self, ldr, motion, live):
+        self.mirror([ldr], [motion], [live])
+
+    def mirror_binary(self, body, out):
+        """Mirror a binary /predict request (see wire_format.py)."""
+        ldr, motion = wire_format.decode_readings(body)
+        self.mirror(ldr, motion, np.frombuffer(out, dtype=np.uint8))
+
+    # ---------- worker ----------
+    def refresh_candidate(self):
+        """(Re)load the candidate when its file appears or changes."""
+        try:
+            st = os.stat(self.path)
+            stat = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return
+        if stat == self.candidate_stat:
+            return
+        self.candidate_stat = stat
+        try:
+            candidate = model_store.build_served_model(self.path)
+            if candidate.stateful:
+                # Mirrored readings carry no device history; cold features would misjudge it
+                self.candidate = None
+                print(f"⚠️ Shadow candidate {self.path} uses per-device state; not shadowing it")
+                return
+            self.candidate = candidate
+            with self.stats_lock:  # New candidate, new comparison
+                self.disagreement.clear()
+                self.counts.update(evaluated=0, higher=0, lower=0)
+                self.diff_sum, self.predict_seconds, self.batches = 0, 0.0, 0
+            print(f"👥 Shadow candidate loaded: {self.path} (version {self.candidate.version})")
+        except Exception as e:
+            print(f"⚠️ Error loading shadow candidate {self.path}: {e}")
+
+    def run(self):
+        checked = float("-inf")
+        while True:
+            if time.monotonic() - checked >= SHADOW_CHECK_INTERVAL:
+                self.refresh_candidate()
+                checked = time.monotonic()
+            try:
+                batch = [self.queue.get(timeout=SHADOW_CHECK_INTERVAL)]
+            except queue.Empty:
+                continue
+            rows = len(batch[0][2])
+            while rows < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+                rows += len(batch[-1][2])
+            try:
+                self.evaluate(batch)
+            except Exception as e:
+                print(f"⚠️ Shadow evaluation error: {e}")
+
+    def evaluate(self, batch):
+        ldr = np.concatenate([np.asarray(b[0], dtype=float) for b in batch])
+        motion = np.concatenate([np.asarray(b[1], dtype=float) for b in batch])
+        live = np.concatenate([np.asarray(b[2], dtype=int) for b in batch])
+        self.counts["mirrored"] += len(live)
+
+        candidate = self.candidate
+        if candidate is None:
+            return
+        start = time.perf_counter()
+        preds = candidate.predict_array(ldr, motion).astype(int)
+        elapsed = time.perf_counter() - start
+        metrics.observe("led_shadow_predict_seconds", (), elapsed)
+
+        diff = preds - live
+        magnitude = np.abs(diff)
+        # Power-of-two buckets of |difference|: 0, ≤1, ≤2, ≤4 … ≤256
+        buckets = np.where(magnitude == 0, 0, 2 ** np.ceil(np.log2(np.maximum(magnitude, 1))).astype(int))
+        values, counts = np.unique(buckets, return_counts=True)
+        agree = int(np.count_nonzero(magnitude == 0))
+        with self.stats_lock:
+            for value, count in zip(values.tolist(), counts.tolist()):
+                self.disagreement[value] += count
+            self.counts["evaluated"] += len(diff)
+            self.counts["higher"] += int(np.count_nonzero(diff > 0))
+            self.counts["lower"] += int(np.count_nonzero(diff < 0))
+            self.diff_sum += int(diff.sum())
+            self.predict_seconds += elapsed
+            self.batches += 1
+        metrics.inc("led_shadow_readings_total", (("result", "agree"),), agree)
+        metrics.inc("led_shadow_readings_total", (("result", "disagree"),), len(diff) - agree)
+
+    def stats(self):
+        with self.stats_lock:
+            histogram = dict(sorted(self.disagreement.items()))
+            counts = dict(self.counts)
+            diff_sum, seconds, batches = self.diff_sum, self.predict_seconds, self.batches
+        evaluated = counts["evaluated"]
+        candidate = self.candidate
+        return {
+            "path": self.path,
+            "candidate_version": candidate.version if candidate else None,
+            "candidate_mode": candidate.mode if candidate else None,
+            **counts,
+            "queued": self.queue.qsize(),
+            "agreement": round(histogram.get(0, 0) / evaluated, 4) if evaluated else None,
+            "mean_difference": round(diff_sum / evaluated, 3) if evaluated else None,
+            "abs_difference_histogram": {("0" if k == 0 else f"le_{k}"): v for k, v in histogram.items()},
+            "candidate_us_per_reading": round(seconds * 1e6 / evaluated, 3) if evaluated else None,
+            "candidate_ms_per_batch": round(seconds * 1e3 / batches, 3) if batches else None,
+        }
@@ -4,8 +4,29 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
+import argparse
 import sys
 import os
+import time
+import forest_search
+import weighted_samples
+from sklearn.base import clone
+from device_state import FEATURES as STATE_FEATURES, add_features, cold_features
+
+parser = argparse.ArgumentParser(description="Train the LED brightness model from ThingsBoard history.")
+parser.add_argument("--stateful", action="store_true",
+                    help="add the per-device rolling features app.py serves (needs a 'ts' column)")
+parser.add_argument("--select", action="store_true",
+                    help="search trees × depth and keep the smallest model within --mae-tolerance")
+parser.add_argument("--weighted", action="store_true",
+                    help="fit repeated (ldr, motion, led) rows once, weighted by their count")
+parser.add_argument("--validate-weights", action="store_true",
+                    help="with --weighted: also fit the raw rows and compare time and test MAE")
+parser.add_argument("--mae-tolerance", type=float, default=0.5,
+                    help="allowed test MAE above the best configuration (PWM units)")
+args = parser.parse_args()
+STATEFUL = args.stateful
+WEIGHTED = args.weighted and not STATEFUL  # Stateful rows differ in their history features
 
 if not os.path.exists("../data"):
     os.makedirs("../data")
@@ -37,13 +58,16 @@ print("\n" + "-" * 50)
 print("DATA CLEANING")
 print("-" * 50)
 
-# Remove timestamp column if exists
-if 'ts' in df.columns or 'Unnamed: 0' in df.columns:
-    df = df.drop(columns=[col for col in ['ts', 'Unnamed: 0'] if col in df.columns])
+# Remove timestamp column if exists (stateful features need it for ordering)
+drop_cols = ['Unnamed: 0'] if STATEFUL else ['ts', 'Unnamed: 0']
+if any(col in df.columns for col in drop_cols):
+    df = df.drop(columns=[col for col in drop_cols if col in df.columns])
     print("✓ Removed timestamp column(s)")
 
 # Check for required columns
 required_cols = ['ldr', 'motion', 'led']
+if STATEFUL:
+    required_cols += ['ts'] + (['device_id'] if 'device_id' in df.columns else [])
 missing_cols = [col for col in required_cols if col not in df.columns]
 if missing_cols:
     print(f"✗ ERROR: Missing columns: {missing_cols}")
@@ -63,13 +87,16 @@ if missing_before > 0:
     print(f"✓ Dropped {dropped} rows with missing values")
 
 # Convert to numeric (if string)
-for col in df.columns:
+for col in ['ldr', 'motion', 'led']:
     df[col] = pd.to_numeric(df[col], errors='coerce')
+if STATEFUL and not pd.api.types.is_numeric_dtype(df['ts']):
+    df['ts'] = pd.to_datetime(df['ts'], errors='coerce')
 
 df = df.dropna()
 
-# Remove duplicates
-duplicates = df.duplicated().sum()
+# Remove duplicates (not for stateful features: a repeated reading is still history;
+# not with --weighted: repeats become sample weights)
+duplicates = 0 if STATEFUL or WEIGHTED else df.duplicated().sum()
 if duplicates > 0:
     df = df.drop_duplicates()
     print(f"✓ Removed {duplicates} duplicate rows")
@@ -95,6 +122,10 @@ if len(df) < 50:
 
 print(f"\n✓ Clean dataset: {len(df)} valid samples")
 
+if STATEFUL:
+    df = add_features(df)
+    print(f"✓ Added stateful features: {', '.join(STATE_FEATURES)}")
+
 # ========== 5. OUTLIER DETECTION ==========
 print("\n" + "-" * 50)
 print("OUTLIER DETECTION")
@@ -122,28 +153,70 @@ for col in ['ldr', 'led']:
         print(f"\n⚠ WARNING: {col} variance too low — model may not learn well.")
 
 # ========== 7. TRAIN / TEST SPLIT ==========
-X = df[['ldr', 'motion']].astype(float)
+feature_cols = ['ldr', 'motion'] + (list(STATE_FEATURES) if STATEFUL else [])
+X = df[feature_cols].astype(float)
 y = df['led'].astype(float)
 
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 print(f"\n✓ Training: {len(X_train)} samples, Test: {len(X_test)} samples")
 
+# Test rows stay raw so weighted and unweighted fits are scored the same way
+X_fit, y_fit, sample_weight = X_train, y_train, None
+if WEIGHTED:
+    X_fit, y_fit, sample_weight = weighted_samples.aggregate(X_train, y_train)
+    print(f"✓ Collapsed {len(X_train)} training rows into {len(X_fit)} weighted samples "
+          f"({len(X_train) / len(X_fit):.1f}× fewer)")
+
 # ========== 8. TRAIN MODEL ==========
 print("\n" + "-" * 50)
 print("TRAINING MODEL")
 print("-" * 50)
 
-model = RandomForestRegressor(
-    n_estimators=200,
-    max_depth=10,
-    min_samples_split=5,
-    min_samples_leaf=2,
-    random_state=42,
-    n_jobs=-1
-)
-model.fit(X_train, y_train)
+if args.select:
+    print(f"Searching depths {forest_search.DEPTHS} × trees {forest_search.TREE_COUNTS}...")
+    results, model = forest_search.search(
+        X_fit, y_fit, X_test, y_test, args.mae_tolerance,
+        sample_weight=sample_weight,
+        min_samples_split=5,
+        min_samples_leaf=2,
+        random_state=42,
+        n_jobs=-1
+    )
+    forest_search.print_report(results, args.mae_tolerance)
+    print(f"\n✓ Selected {model.n_estimators} trees, max_depth={model.max_depth}")
+else:
+    model = RandomForestRegressor(
+        n_estimators=200,
+        max_depth=10,
+        min_samples_split=5,
+        min_samples_leaf=2,
+        random_state=42,
+        n_jobs=-1
+    )
+    start = time.perf_counter()
+    model.fit(X_fit, y_fit, sample_weight=sample_weight)
+    fit_seconds = time.perf_counter() - start
+    print(f"  Fit: {fit_seconds:.2f}s on {len(X_fit)} rows")
 print("✓ Training complete")
 
+if WEIGHTED and args.validate_weights:
+    # Same configuration on the raw rows: is anything lost, and what was saved?
+    if args.select:  # The search fitted a whole grid; time the chosen configuration alone
+        start = time.perf_counter()
+        clone(model).fit(X_fit, y_fit, sample_weight=sample_weight)
+        fit_seconds = time.perf_counter() - start
+    raw = clone(model)
+    start = time.perf_counter()
+    raw.fit(X_train, y_train)
+    raw_seconds = time.perf_counter() - start
+    raw_mae = mean_absolute_error(y_test, np.clip(raw.predict(X_test), 0, 255))
+    weighted_mae = mean_absolute_error(y_test, np.clip(model.predict(X_test), 0, 255))
+    print(f"\nWeighted samples: {len(X_train)} → {len(X_fit)} rows "
+          f"(compression {len(X_train) / len(X_fit):.1f}×)")
+    print(f"  Fit time: raw {raw_seconds:.2f}s, weighted {fit_seconds:.2f}s "
+          f"(speed-up {raw_seconds / fit_seconds:.1f}×)")
+    print(f"  Test MAE: raw {raw_mae:.3f}, weighted {weighted_mae:.3f} (Δ {weighted_mae - raw_mae:+.3f})")
+
 # ========== 9. EVALUATION ==========
 y_pred_train = np.clip(model.predict(X_train), 0, 255)
 y_pred_test = np.clip(model.predict(X_test), 0, 255)
@@ -157,12 +230,14 @@ print(f"\nTrain → MAE: {train_mae:.2f}, R²: {train_r2:.3f}")
 print(f"Test  → MAE: {test_mae:.2f}, R²: {test_r2:.3f}")
 
 print(f"\nFeature Importance:")
-print(f"  LDR: {model.feature_importances_[0]:.3f}")
-print(f"  Motion: {model.feature_importances_[1]:.3f}")
+for col, importance in zip(feature_cols, model.feature_importances_):
+    print(f"  {col}: {importance:.3f}")
 
 # ========== 10. SAVE MODEL ==========
 try:
-    joblib.dump(model, "led_predictor.pkl")
+    # Write then rename: the watcher never sees a half-written file
+    joblib.dump(model, "led_predictor.pkl.tmp")
+    os.replace("led_predictor.pkl.tmp", "led_predictor.pkl")
     print("\n" + "=" * 50)
     print("✓ MODEL SAVED: led_predictor.pkl")
     print("=" * 50)
@@ -181,7 +256,12 @@ samples = [
     (1500, 1, "Medium + Motion")
 ]
 for ldr, motion, desc in samples:
-    pred = int(np.clip(model.predict([[ldr, motion]])[0], 0, 255))
+    row = {'ldr': [ldr], 'motion': [motion]}
+    if STATEFUL:  # As the first reading from a device
+        row.update(zip(STATE_FEATURES, cold_features([ldr], [motion])))
+    pred = int(np.clip(model.predict(pd.DataFrame(row)[feature_cols])[0], 0, 255))
     print(f"{desc:20s} → PWM: {pred:3d}")
 
-print("\n✓ Ready for deployment!")
\ No newline at end of file
+print("\n✓ Ready for deployment!")
+if not STATEFUL:
+    print("  On-device inference: python export_header.py  (writes ../led_model.h)")
\ No newline at end of file
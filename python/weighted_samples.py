@@ -0,0 +1,44 @@
+# ============================================================
+# weighted_samples.py  — Collapse repeated telemetry into weights
+# ============================================================
+#
+# A device reports the same reading every 5 seconds for hours, so raw
+# history is mostly repeats. Each (ldr, motion, led) row packs into one
+# 21-bit integer key
+#
+#     ldr (12 bits) << 9  |  motion (1 bit) << 8  |  led (8 bits)
+#
+# and one np.bincount over the 2^21 key space counts every distinct row
+# in a single O(n) pass. The distinct rows are then fitted with their
+# counts as sample_weight instead of being dropped or repeated.
+#
+# Used by: python train_model.py --weighted
+
+import numpy as np
+import pandas as pd
+
+LDR_BITS, MOTION_BITS, LED_BITS = 12, 1, 8
+KEY_SPACE = 1 << (LDR_BITS + MOTION_BITS + LED_BITS)
+
+
+def pack(ldr, motion, led):
+    """Integer keys for validated rows (ldr 0–4095, motion 0/1, led 0–255, rounded)."""
+    ldr = np.rint(np.asarray(ldr, dtype=float)).astype(np.int64)
+    motion = np.asarray(motion, dtype=float).astype(np.int64)
+    led = np.rint(np.asarray(led, dtype=float)).astype(np.int64)
+    return (ldr << (MOTION_BITS + LED_BITS)) | (motion << LED_BITS) | led
+
+
+def unpack(keys):
+    return (keys >> (MOTION_BITS + LED_BITS),
+            (keys >> LED_BITS) & ((1 << MOTION_BITS) - 1),
+            keys & ((1 << LED_BITS) - 1))
+
+
+def aggregate(X, y):
+    """Raw rows → (distinct X, y, counts as sample_weight), sorted by key."""
+    counts = np.bincount(pack(X["ldr"], X["motion"], y), minlength=KEY_SPACE)
+    keys = np.flatnonzero(counts)
+    ldr, motion, led = unpack(keys)
+    X_agg = pd.DataFrame({"ldr": ldr.astype(float), "motion": motion.astype(float)})
+    return X_agg, pd.Series(led.astype(float), name=y.name), counts[keys].astype(float)
@@ -0,0 +1,100 @@
+# ============================================================
+# wire_format.py  — Compact binary /predict encoding
+# ============================================================
+#
+# POST /predict with Content-Type: application/octet-stream
+#   request:  N × 3-byte records, little-endian  <uint16 ldr><uint8 motion>
+#   response: N × 1 byte, the clamped LED value for each record, in order
+# A single reading is just N = 1 (3 bytes in, 1 byte out, vs ~30 / ~12
+# bytes of JSON). The model version travels in X-Model-Version as usual.
+#
+# Usage (throughput comparison through the Flask stack, no network):
+#   LOG_MODE=json LOG_SAMPLE_EVERY=1000 python wire_format.py [requests]
+
+import struct
+import sys
+import time
+
+import numpy as np
+
+CONTENT_TYPE = "application/octet-stream"
+RECORD = struct.Struct("<HB")
+RECORD_DTYPE = np.dtype([("ldr", "<u2"), ("motion", "u1")])
+
+
+def decode_readings(body):
+    """Body bytes → (ldr, motion) integer arrays. ValueError if misaligned."""
+    if not body or len(body) % RECORD.size:
+        raise ValueError(f"body must be a non-empty multiple of {RECORD.size} bytes")
+    records = np.frombuffer(body, dtype=RECORD_DTYPE)
+    return records["ldr"], records["motion"]
+
+
+def encode_readings(readings):
+    """[(ldr, motion), ...] → request body (client side / tests)."""
+    return b"".join(RECORD.pack(int(ldr), int(motion)) for ldr, motion in readings)
+
+
+def encode_predictions(preds):
+    return np.asarray(preds, dtype=np.uint8).tobytes()
+
+
+def lookup_binary(table, body):
+    """Response bytes gathered from the LUT, or None if any record is off-grid."""
+    ldr, motion = decode_readings(body)
+    if ldr.max() < table.shape[1] and motion.max() < table.shape[0]:
+        return table[motion, ldr].tobytes()  # All on-grid: pure gather, no floats
+    return None
+
+
+def predict_binary(served, body, states=None, device_id=None):
+    """Decode, predict and encode one binary request body.
+
+    For a stateful model, pass the server's DeviceState: every record is
+    taken as the next reading from `device_id`, in order.
+    """
+    if served.lut is not None:
+        out = lookup_binary(served.lut, body)
+        if out is not None:
+            return out
+    ldr, motion = decode_readings(body)
+    state = None
+    if served.stateful and states is not None:
+        state = states.update_many([device_id] * len(ldr), ldr, motion)
+    return encode_predictions(served.predict_array(ldr, motion, state))
+
+
+# ============================================================
+# Throughput comparison: JSON vs binary
+# ============================================================
+def compare(requests=2000, batch=64):
+    import app  # Imported here so the codec stays free of Flask
+
+    client = app.app.test_client()
+    rng = np.random.default_rng(0)
+    readings = list(zip(rng.integers(0, 4096, batch).tolist(), rng.integers(0, 2, batch).tolist()))
+
+    cases = {
+        "json/1": dict(path="/predict", json={"ldr": readings[0][0], "motion": readings[0][1]}),
+        "binary/1": dict(path="/predict", data=encode_readings(readings[:1]), content_type=CONTENT_TYPE),
+        f"json/{batch}": dict(path="/predict/batch",
+                              json={"readings": [{"ldr": l, "motion": m} for l, m in readings]}),
+        f"binary/{batch}": dict(path="/predict", data=encode_readings(readings), content_type=CONTENT_TYPE),
+    }
+
+    print(f"{'case':12s} {'req/s':>9s} {'readings/s':>11s} {'req bytes':>10s} {'resp bytes':>11s}")
+    for name, kwargs in cases.items():
+        path = kwargs.pop("path")
+        rows = int(name.split("/")[1])
+        response = client.post(path, **kwargs)
+        request_bytes = int(response.request.headers.get("Content-Length", 0))
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.post(path, **kwargs)
+        elapsed = time.perf_counter() - start
+        print(f"{name:12s} {requests / elapsed:9.0f} {requests * rows / elapsed:11.0f} "
+              f"{request_bytes:10d} {len(response.data):11d}")
+
+
+if __name__ == "__main__":
+    compare(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)